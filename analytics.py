@@ -0,0 +1,141 @@
+﻿# analytics.py
+# Сводная аналитика по всем пользователям для администраторов (/admin_report)
+
+import os
+import time
+import asyncio
+from datetime import datetime
+
+import numpy as np
+
+# Настройки (можно переопределить через .env)
+ADMIN_REPORT_CACHE_SECONDS = int(os.getenv("ADMIN_REPORT_CACHE_SECONDS", "300"))
+ADMIN_REPORT_ACTIVITY_DAYS = int(os.getenv("ADMIN_REPORT_ACTIVITY_DAYS", "14"))
+ADMIN_REPORT_INACTIVE_DAYS = int(os.getenv("ADMIN_REPORT_INACTIVE_DAYS", "7"))
+
+# Границы категорий среднего систолического давления
+SYSTOLIC_BINS = [0, 120, 130, 140, 160, 1000]
+SYSTOLIC_LABELS = ["<120", "120–129", "130–139", "140–159", "≥160"]
+
+_cache = {"report": None, "created": 0.0}
+_lock = asyncio.Lock()
+
+
+def build_admin_report(rows, today=None):
+    """
+    Считает сводные показатели по строкам Storage.user_day_aggregates с помощью NumPy.
+    """
+    today = np.datetime64(today or datetime.now().date(), "D")
+
+    if not rows:
+        return {"users_total": 0}
+
+    user_ids = np.array([r[0] for r in rows], dtype=np.int64)
+    has_data = np.array([r[1] is not None for r in rows])
+    days = np.array([r[1] or "1970-01-01" for r in rows], dtype="datetime64[D]")
+    counts = np.array([r[2] or 0 for r in rows], dtype=np.int64)
+    sums = np.array([(r[3] or 0, r[4] or 0, r[5] or 0) for r in rows], dtype=np.float64)
+
+    # Индексы пользователей 0..n-1 для bincount
+    users, user_idx = np.unique(user_ids, return_inverse=True)
+    n_users = len(users)
+
+    readings_per_user = np.bincount(user_idx, weights=counts, minlength=n_users)
+    sums_per_user = np.stack(
+        [np.bincount(user_idx, weights=sums[:, i], minlength=n_users) for i in range(3)],
+        axis=1
+    )
+    with_readings = readings_per_user > 0
+    means = sums_per_user[with_readings] / readings_per_user[with_readings, None]
+
+    # Последний день с записью у каждого пользователя
+    last_day = np.full(n_users, np.iinfo(np.int64).min, dtype=np.int64)
+    np.maximum.at(last_day, user_idx[has_data], days[has_data].astype(np.int64))
+    inactive_since = today - np.timedelta64(ADMIN_REPORT_INACTIVE_DAYS, "D")
+    inactive = last_day < inactive_since.astype(np.int64)
+
+    # Активные пользователи по дням за последние N дней
+    window_start = today - np.timedelta64(ADMIN_REPORT_ACTIVITY_DAYS - 1, "D")
+    recent = has_data & (days >= window_start) & (days <= today)
+    day_range = np.arange(window_start, today + np.timedelta64(1, "D"), dtype="datetime64[D]")
+    active_per_day = np.bincount(
+        (days[recent] - window_start).astype(np.int64),
+        minlength=len(day_range)
+    )
+
+    systolic_hist, _ = np.histogram(means[:, 0], bins=SYSTOLIC_BINS)
+    per_user = readings_per_user[with_readings]
+
+    return {
+        "users_total": int(n_users),
+        "users_with_readings": int(with_readings.sum()),
+        "readings_total": int(readings_per_user.sum()),
+        "active_per_day": [(str(d), int(c)) for d, c in zip(day_range, active_per_day)],
+        "readings_per_user": {
+            "mean": float(per_user.mean()) if len(per_user) else 0.0,
+            "median": float(np.median(per_user)) if len(per_user) else 0.0,
+            "p90": float(np.percentile(per_user, 90)) if len(per_user) else 0.0,
+            "max": int(per_user.max()) if len(per_user) else 0,
+        },
+        "avg_pressure": {
+            "systolic_median": float(np.median(means[:, 0])) if len(means) else 0.0,
+            "diastolic_median": float(np.median(means[:, 1])) if len(means) else 0.0,
+            "pulse_median": float(np.median(means[:, 2])) if len(means) else 0.0,
+            "systolic_hist": list(zip(SYSTOLIC_LABELS, (int(x) for x in systolic_hist))),
+        },
+        "inactive_users": [int(u) for u in users[inactive]],
+    }
+
+
+def format_admin_report(report):
+    """
+    Текстовое представление отчёта для отправки в Telegram.
+    """
+    if not report.get("users_total"):
+        return "📭 Пользователей пока нет."
+
+    rpu = report["readings_per_user"]
+    avg = report["avg_pressure"]
+    inactive = report["inactive_users"]
+
+    text = (
+        "📊 Сводный отчёт\n\n"
+        f"👥 Пользователей: {report['users_total']} (с записями: {report['users_with_readings']})\n"
+        f"📝 Всего записей: {report['readings_total']}\n\n"
+        "📅 Активные пользователи по дням:\n"
+    )
+    for day, count in report["active_per_day"]:
+        text += f"{datetime.strptime(day, '%Y-%m-%d').strftime('%d.%m')}: {count}\n"
+
+    text += (
+        "\n📋 Записей на пользователя:\n"
+        f"среднее {rpu['mean']:.1f}, медиана {rpu['median']:.0f}, 90% ≤ {rpu['p90']:.0f}, максимум {rpu['max']}\n\n"
+        "🩺 Среднее давление пользователей (медиана):\n"
+        f"{avg['systolic_median']:.0f} / {avg['diastolic_median']:.0f}, пульс {avg['pulse_median']:.0f}\n"
+        "Распределение среднего верхнего давления:\n"
+    )
+    for label, count in avg["systolic_hist"]:
+        text += f"{label}: {count}\n"
+
+    text += f"\n💤 Без записей за {ADMIN_REPORT_INACTIVE_DAYS} дн.: {len(inactive)}"
+    if inactive:
+        shown = ", ".join(str(u) for u in inactive[:20])
+        text += f"\n{shown}" + (" …" if len(inactive) > 20 else "")
+    return text
+
+
+async def get_admin_report(storage):
+    """
+    Возвращает текст отчёта. Расчёт выполняется в отдельном потоке,
+    результат кэшируется на ADMIN_REPORT_CACHE_SECONDS секунд.
+    """
+    async with _lock:
+        if _cache["report"] is not None and time.monotonic() - _cache["created"] < ADMIN_REPORT_CACHE_SECONDS:
+            return _cache["report"]
+
+        def compute():
+            return format_admin_report(build_admin_report(storage.user_day_aggregates()))
+
+        _cache["report"] = await asyncio.to_thread(compute)
+        _cache["created"] = time.monotonic()
+        return _cache["report"]
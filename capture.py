@@ -0,0 +1,137 @@
+﻿# capture.py
+# Запись входящих обновлений для последующего воспроизведения (check/replay_updates.py)
+
+import os
+import re
+import gzip
+import hmac
+import json
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from aiogram import BaseMiddleware
+
+# Настройки (можно переопределить через .env)
+CAPTURE_UPDATES = os.getenv("CAPTURE_UPDATES", "0") == "1"
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", os.path.join("logs", "capture"))
+# Соль для псевдонимов id; без неё берётся случайная на время жизни процесса
+CAPTURE_SALT = os.getenv("CAPTURE_SALT") or os.urandom(16).hex()
+
+# Поля с персональными данными, которые вырезаются целиком
+DROP_FIELDS = {"last_name", "username", "vcard", "bio"}
+# Обязательные поля с персональными данными, которые заменяются заглушкой
+# (без них aiogram не разберёт обновление, например Contact при регистрации)
+REPLACE_FIELDS = {"first_name": "User", "phone_number": "+70000000000"}
+# Объекты, описывающие пользователя или чат: их id заменяются псевдонимами
+PERSON_FIELDS = {"from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat"}
+# Отдельные поля с id пользователя
+ID_FIELDS = {"user_id", "chat_id"}
+
+_LETTERS_RE = re.compile(r"[^\W\d_]", re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def pseudonymize_id(value, salt=CAPTURE_SALT):
+    """
+    Детерминированно заменяет id на псевдоним: один и тот же пользователь
+    в рамках записи получает один и тот же id, исходный восстановить нельзя.
+    """
+    digest = hmac.new(salt.encode(), str(value).encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], "big") & 0x7FFFFFFF or 1
+
+
+def mask_text(text, keep_texts=()):
+    """
+    Маскирует свободный текст: буквы заменяются на "x", цифры и знаки остаются,
+    чтобы числа давления и структура сообщения сохранились для маршрутизации.
+    Тексты кнопок (keep_texts) и имена команд не трогаются.
+    """
+    if text in keep_texts:
+        return text
+    if text.startswith("/"):
+        command, _, args = text.partition(" ")
+        return command + (" " + _LETTERS_RE.sub("x", args) if args else "")
+    return _LETTERS_RE.sub("x", text)
+
+
+def anonymize(obj, keep_texts=(), salt=CAPTURE_SALT, key=None):
+    """
+    Рекурсивно обезличивает JSON-представление обновления.
+    """
+    if isinstance(obj, dict):
+        result = {
+            k: REPLACE_FIELDS[k] if k in REPLACE_FIELDS else anonymize(v, keep_texts, salt, k)
+            for k, v in obj.items()
+            if k not in DROP_FIELDS
+        }
+        if key in PERSON_FIELDS and isinstance(result.get("id"), int):
+            result["id"] = pseudonymize_id(result["id"], salt)
+        return result
+    if isinstance(obj, list):
+        return [anonymize(v, keep_texts, salt, key) for v in obj]
+    if key in ID_FIELDS and isinstance(obj, int):
+        return pseudonymize_id(obj, salt)
+    if key in ("text", "caption") and isinstance(obj, str):
+        return mask_text(obj, keep_texts)
+    return obj
+
+
+class CaptureWriter:
+    """
+    Обезличивает и пишет обновления в сжатый append-only файл из фонового потока.
+    Каждая строка: {"t": время получения (unix), "u": обезличенный Update}.
+    """
+
+    def __init__(self, directory=CAPTURE_DIR, keep_texts=()):
+        self.keep_texts = frozenset(keep_texts)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"updates_{datetime.now():%Y-%m-%d_%H-%M-%S}.jsonl.gz")
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="update-capture", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, received_at, payload):
+        self._queue.put((received_at, payload))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                received_at, payload = item
+                record = {"t": received_at, "u": anonymize(payload, self.keep_texts)}
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                if self._queue.empty():
+                    f.flush()
+
+
+class CaptureMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для dp.update: сохраняет каждое входящее обновление
+    с временем получения. На обработку обновления не влияет.
+    """
+
+    def __init__(self, keep_texts=(), writer=None):
+        self.writer = writer or CaptureWriter(keep_texts=keep_texts)
+        logger.info("Запись обновлений включена: %s", self.writer.path)
+
+    async def __call__(self, handler, event, data):
+        try:
+            payload = event.model_dump(mode="json", exclude_none=True, by_alias=True)
+            self.writer.write(round(time.time(), 3), payload)
+        except Exception:
+            logger.exception("Не удалось записать обновление")
+        return await handler(event, data)
@@ -0,0 +1,117 @@
+﻿# charts.py
+# Построение графика давления на заранее подготовленном шаблоне фигуры
+
+import os
+import threading
+from io import BytesIO
+
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Настройки вывода (можно переопределить через .env).
+# Telegram ужимает фото до ~1280 px по длинной стороне, больше отправлять нет смысла.
+CHART_MAX_SIDE_PX = int(os.getenv("CHART_MAX_SIDE_PX", "1280"))
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png").lower()  # png или jpeg
+CHART_JPEG_QUALITY = int(os.getenv("CHART_JPEG_QUALITY", "85"))
+
+# Ограничения Telegram для sendPhoto
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_SIDES_SUM = 10000
+
+FIGSIZE = (12, 7)
+
+
+def output_dpi(figsize=FIGSIZE, max_side_px=CHART_MAX_SIDE_PX):
+    """
+    Подбирает DPI так, чтобы длинная сторона картинки была не больше max_side_px
+    и сумма сторон укладывалась в ограничение Telegram.
+    """
+    max_side_px = min(max_side_px, TELEGRAM_PHOTO_MAX_SIDES_SUM * max(figsize) / sum(figsize))
+    return max_side_px / max(figsize)
+
+
+class PressureChart:
+    """
+    Шаблон графика: оси, подписи, сетка и легенда создаются один раз,
+    при каждом запросе подменяются только данные линий.
+    """
+
+    def __init__(self):
+        self.figure = Figure(figsize=FIGSIZE)
+        FigureCanvasAgg(self.figure)
+        ax = self.figure.add_subplot()
+
+        self.systolic_line, = ax.plot([], [], label="Верхнее (сист.)", marker="o")
+        self.diastolic_line, = ax.plot([], [], label="Нижнее (диаст.)", marker="o")
+        self.pulse_line, = ax.plot([], [], label="Пульс", linestyle="--", marker="x")
+
+        ax.set_xlabel("Дата и время", fontsize=12)
+        ax.set_ylabel("Значение", fontsize=12)
+        ax.set_title("Динамика давления и пульса", fontsize=14)
+        ax.legend(fontsize=10)
+        ax.grid(True)
+
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%d.%m.%Y %H:%M"))
+        ax.tick_params(axis="x", labelrotation=45)
+
+        # Фиксированные поля вместо tight_layout / bbox_inches="tight" на каждом запросе
+        self.figure.subplots_adjust(left=0.06, right=0.98, top=0.94, bottom=0.2)
+        self.ax = ax
+
+    def draw(self, dates, systolic, diastolic, pulse):
+        """
+        Подставляет данные в линии шаблона (без сохранения).
+        """
+        x = mdates.date2num(dates)
+        self.systolic_line.set_data(x, systolic)
+        self.diastolic_line.set_data(x, diastolic)
+        self.pulse_line.set_data(x, pulse)
+
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def render(self, dates, systolic, diastolic, pulse, fmt=CHART_FORMAT):
+        """
+        Рисует данные и возвращает (байты изображения, имя файла).
+        """
+        self.draw(dates, systolic, diastolic, pulse)
+
+        buffer = BytesIO()
+        if fmt in ("jpg", "jpeg"):
+            self.figure.savefig(
+                buffer, format="jpeg", dpi=output_dpi(),
+                pil_kwargs={"quality": CHART_JPEG_QUALITY, "optimize": True}
+            )
+            filename = "pressure_graph.jpg"
+        else:
+            self.figure.savefig(buffer, format="png", dpi=output_dpi())
+            filename = "pressure_graph.png"
+            if buffer.tell() > TELEGRAM_PHOTO_MAX_BYTES:
+                # Слишком большой PNG Telegram не примет как фото — пересохраняем в JPEG
+                return self.render(dates, systolic, diastolic, pulse, fmt="jpeg")
+        return buffer.getvalue(), filename
+
+
+# Фигура matplotlib не потокобезопасна, поэтому у каждого потока свой шаблон
+_local = threading.local()
+
+
+def pressure_chart():
+    """
+    Шаблон графика текущего потока (создаётся при первом обращении).
+    """
+    chart = getattr(_local, "chart", None)
+    if chart is None:
+        chart = _local.chart = PressureChart()
+    return chart
+
+
+def render_pressure_chart(dates, systolic, diastolic, pulse):
+    """
+    Рендерит график давления на шаблоне текущего потока.
+    Вызывать из отдельного потока (asyncio.to_thread), чтобы не блокировать бота.
+    """
+    return pressure_chart().render(dates, systolic, diastolic, pulse)
@@ -0,0 +1,69 @@
+﻿import sys
+import os
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from charts import PressureChart
+
+
+def make_data(n):
+    start = datetime(2025, 1, 1, 8, 0)
+    dates = [start + timedelta(hours=12 * i) for i in range(n)]
+    systolic = [120 + (i * 7) % 30 for i in range(n)]
+    diastolic = [80 + (i * 5) % 15 for i in range(n)]
+    pulse = [65 + (i * 3) % 20 for i in range(n)]
+    return dates, systolic, diastolic, pulse
+
+
+def render_legacy(dates, systolic, diastolic, pulse):
+    """
+    Прежний способ: новая фигура на каждый запрос, tight-layout, dpi=300.
+    """
+    formatted_dates = [dt.strftime("%d.%m.%Y %H:%M") for dt in dates]
+    plt.figure(figsize=(12, 7))
+    plt.plot(formatted_dates, systolic, label="Верхнее (сист.)", marker="o")
+    plt.plot(formatted_dates, diastolic, label="Нижнее (диаст.)", marker="o")
+    plt.plot(formatted_dates, pulse, label="Пульс", linestyle="--", marker="x")
+    plt.xlabel("Дата и время", fontsize=12)
+    plt.ylabel("Значение", fontsize=12)
+    plt.title("Динамика давления и пульса", fontsize=14)
+    plt.legend(fontsize=10)
+    plt.grid(True)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    buffer = BytesIO()
+    plt.savefig(buffer, format="png", dpi=300, bbox_inches="tight")
+    plt.close()
+    return buffer.getvalue()
+
+
+def bench(name, func, runs):
+    func()  # прогрев
+    sizes = []
+    start = time.process_time()
+    for _ in range(runs):
+        sizes.append(len(func()))
+    elapsed = (time.process_time() - start) / runs
+    print(f"{name:<22} {elapsed * 1000:8.1f} мс CPU  {sum(sizes) / runs / 1024:8.1f} КБ")
+    return elapsed
+
+
+if __name__ == "__main__":
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    data = make_data(n_points)
+    chart = PressureChart()
+
+    print(f"Точек на графике: {n_points}, повторов: {runs}")
+    legacy = bench("pyplot, dpi=300", lambda: render_legacy(*data), runs)
+    png = bench("шаблон, PNG", lambda: chart.render(*data, fmt="png")[0], runs)
+    jpeg = bench("шаблон, JPEG", lambda: chart.render(*data, fmt="jpeg")[0], runs)
+    print(f"Ускорение: PNG x{legacy / png:.1f}, JPEG x{legacy / jpeg:.1f}")
@@ -3,19 +3,14 @@ import os
 import logging
 from db_config import DB_NAME
 
-# Настройка логгера
-os.makedirs("logs", exist_ok=True)
-logging.basicConfig(
-    filename="logs/init.log",
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s"
-)
+# Логи пишутся через общую настройку из logging_setup (setup_logging в main.py)
+logger = logging.getLogger(__name__)
 
 def check_and_create_tables():
-    logging.info("Проверка базы данных: %s", DB_NAME)
+    logger.info("Проверка базы данных: %s", DB_NAME)
 
     if not os.path.exists(DB_NAME):
-        logging.info("Файл базы данных не найден. Создаю: %s", DB_NAME)
+        logger.info("Файл базы данных не найден. Создаю: %s", DB_NAME)
         conn = sqlite3.connect(DB_NAME)
         conn.close()
 
@@ -25,7 +20,7 @@ def check_and_create_tables():
     # ad_users
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ad_users';")
     if cursor.fetchone() is None:
-        logging.info("Создаю таблицу ad_users")
+        logger.info("Создаю таблицу ad_users")
         cursor.execute("""
             CREATE TABLE ad_users (
                 user_id INTEGER PRIMARY KEY,
@@ -38,7 +33,7 @@ def check_and_create_tables():
     # ad_pressure_measurements
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ad_pressure_measurements';")
     if cursor.fetchone() is None:
-        logging.info("Создаю таблицу ad_pressure_measurements")
+        logger.info("Создаю таблицу ad_pressure_measurements")
         cursor.execute("""
             CREATE TABLE ad_pressure_measurements (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -53,4 +48,4 @@ def check_and_create_tables():
 
     conn.commit()
     conn.close()
-    logging.info("Проверка завершена. База данных готова.")
+    logger.info("Проверка завершена. База данных готова.")
@@ -0,0 +1,258 @@
+﻿import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+# Добавляем путь к корневой директории проекта
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from aiogram import Bot, BaseMiddleware
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update, Message, Chat
+from pydantic import ValidationError
+
+# Воспроизведение записанных обновлений (capture.py) на заглушке Bot и временной базе.
+# Пример: python check/replay_updates.py logs/capture/updates_2025-01-01_00-00-00.jsonl.gz --speed 10
+
+
+class ReplaySession(BaseSession):
+    """
+    Сессия без сети: на любой запрос к Bot API отвечает правдоподобной заглушкой.
+    """
+
+    def __init__(self, latency_ms=0.0):
+        super().__init__()
+        self.latency = latency_ms / 1000
+        self.requests = 0
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        returning = method.__returning__
+        if returning is Message:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            ).as_(bot)
+        if returning is bool:
+            return True
+        try:
+            return returning.model_construct()
+        except Exception:
+            return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class LatencyMiddleware(BaseMiddleware):
+    """
+    Собирает длительность вызова каждого обработчика.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.stats.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+
+
+def read_capture(path):
+    """
+    Читает записи из файла захвата. Оборванный хвост (например, после падения) пропускается.
+    """
+    records = []
+    opener = gzip.open if path.endswith(".gz") else open
+    try:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    except (EOFError, json.JSONDecodeError):
+        pass
+    return records
+
+
+def update_sender(payload):
+    """
+    id отправителя обновления или None.
+    """
+    for key in ("message", "callback_query", "edited_message"):
+        user = payload.get(key, {}).get("from")
+        if user:
+            return user["id"]
+    return None
+
+
+def captured_user_ids(records):
+    return {update_sender(record["u"]) for record in records} - {None}
+
+
+def prepare_scratch_db(db_path, seed_db, records, interface_version):
+    """
+    Готовит временную базу: копия seed_db (если указана) и регистрация
+    всех пользователей из записи, чтобы их сценарии шли как у существующих.
+    """
+    if seed_db:
+        shutil.copyfile(seed_db, db_path)
+
+    from check.check_exists_db import check_and_create_tables
+    check_and_create_tables()
+
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT OR IGNORE INTO ad_users (user_id, phone, interface_version) VALUES (?, ?, ?)",
+        [(user_id, f"replay-{user_id}", interface_version) for user_id in captured_user_ids(records)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def register_in_storage(storage, records, interface_version):
+    """
+    То же для хранилища в памяти: оно пустое при каждом запуске.
+    """
+    for user_id in captured_user_ids(records):
+        storage.register_user(user_id, f"replay-{user_id}")
+        storage.update_user(user_id, interface_version=interface_version)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def print_report(stats, total_ms, updates, requests, wall, skipped=0):
+    print("\n--- Задержки обработчиков, мс ---")
+    print(f"{'обработчик':<28}{'вызовов':>8}{'p50':>9}{'p95':>9}{'max':>9}")
+    for name, values in sorted(stats.items(), key=lambda item: -sum(item[1])):
+        print(f"{name:<28}{len(values):>8}{percentile(values, 50):>9.2f}"
+              f"{percentile(values, 95):>9.2f}{max(values):>9.2f}")
+    if total_ms:
+        print(f"\n{'обновление целиком':<28}{len(total_ms):>8}{percentile(total_ms, 50):>9.2f}"
+              f"{percentile(total_ms, 95):>9.2f}{max(total_ms):>9.2f}")
+    print(f"\nОбновлений: {updates}, запросов к Bot API: {requests}, время: {wall:.2f} с")
+    if skipped:
+        print(f"Пропущено неразобранных обновлений: {skipped}")
+
+
+async def replay(records, speed, latency_ms):
+    import main
+    from config import BOT_TOKEN, INTERFACE_VERSION
+    from database import InMemoryStorage
+
+    if isinstance(main.storage, InMemoryStorage):
+        register_in_storage(main.storage, records, INTERFACE_VERSION)
+
+    session = ReplaySession(latency_ms)
+    bot = Bot(token=BOT_TOKEN, session=session)
+    stats = {}
+    main.dp.message.middleware(LatencyMiddleware(stats))
+    main.dp.callback_query.middleware(LatencyMiddleware(stats))
+
+    total_ms = []
+
+    invalid = 0
+
+    async def feed(payload):
+        nonlocal invalid
+        try:
+            update = Update.model_validate(payload, context={"bot": bot})
+        except ValidationError as e:
+            # Битая запись не должна обрывать воспроизведение: считаем и пропускаем
+            invalid += 1
+            print(f"Пропущено update_id={payload.get('update_id')}: ошибок разбора: {e.error_count()}")
+            return
+        start = time.perf_counter()
+        try:
+            await main.dp.feed_update(bot, update)
+        except Exception as e:
+            print(f"Ошибка при обработке update_id={update.update_id}: {e}")
+        total_ms.append((time.perf_counter() - start) * 1000)
+
+    async def feed_after(previous, payload):
+        # Обновления одного пользователя — строго по порядку, как при поллинге
+        if previous is not None:
+            await previous
+        await feed(payload)
+
+    tasks = []
+    last_task = {}  # id отправителя -> задача его последнего обновления
+    start_wall = time.perf_counter()
+    first_t = records[0]["t"] if records else 0
+    for record in records:
+        if speed > 0:
+            # Выдерживаем исходные интервалы между обновлениями (с ускорением)
+            delay = (record["t"] - first_t) / speed - (time.perf_counter() - start_wall)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sender = update_sender(record["u"])
+        task = asyncio.create_task(feed_after(last_task.get(sender), record["u"]))
+        if sender is not None:
+            last_task[sender] = task
+        tasks.append(task)
+    await asyncio.gather(*tasks)
+
+    print_report(stats, total_ms, len(records), session.requests, time.perf_counter() - start_wall, invalid)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument("capture", help="Файл захвата (.jsonl или .jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Ускорение относительно исходного темпа; 0 — без пауз")
+    parser.add_argument("--seed-db", help="База, копия которой используется как исходное состояние")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0,
+                        help="Искусственная задержка ответа Bot API")
+    parser.add_argument("--storage", choices=["sqlite", "memory"], default="sqlite",
+                        help="Хранилище бота; memory — без дискового ввода-вывода")
+    args = parser.parse_args()
+
+    records = read_capture(args.capture)
+    if not records:
+        print("В файле нет записей.")
+        sys.exit(1)
+
+    # Всё, что бот пишет на диск, — во временный каталог, до импорта main (он читает пути при загрузке)
+    scratch_dir = tempfile.mkdtemp(prefix="replay_")
+    os.environ["DB_NAME"] = os.path.join(scratch_dir, "data.db")
+    os.environ["ARCHIVE_DIR"] = os.path.join(scratch_dir, "archive")
+    os.environ["LOG_DIR"] = os.path.join(scratch_dir, "logs")
+    os.environ["REPORTS_DIR"] = os.path.join(scratch_dir, "reports")
+    os.environ["MEM_SNAPSHOT_DIR"] = os.path.join(scratch_dir, "memory")
+    os.environ["BACKUP_DIR"] = os.path.join(scratch_dir, "backups")
+    os.environ["CAPTURE_UPDATES"] = "0"
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.chdir(ROOT_DIR)
+
+    if args.storage == "sqlite":
+        from config import INTERFACE_VERSION
+        prepare_scratch_db(os.environ["DB_NAME"], args.seed_db, records, INTERFACE_VERSION)
+        print(f"Временная база: {os.environ['DB_NAME']}")
+    asyncio.run(replay(records, args.speed, args.api_latency_ms))
@@ -9,6 +9,13 @@ from .db_operations import (
     update_user_data
 )
 from .migrations import apply_migrations
+from .archive import archive_old_records, connect_all_tiers, ALL_MEASUREMENTS_VIEW
+from .search import search_comments
+from .baselines import update_baseline, assess_reading
+from .storage import Storage, get_storage, MEASUREMENT_HEADERS
+from .sqlite_storage import SQLiteStorage
+from .memory_storage import InMemoryStorage
+from .recent_cache import RecentReadingsCache
 
 __all__ = [
     "get_user",
@@ -16,5 +23,17 @@ __all__ = [
     "save_pressure_record",
     "get_user_records",
     "update_user_data",
-    "apply_migrations"
+    "apply_migrations",
+    "archive_old_records",
+    "connect_all_tiers",
+    "ALL_MEASUREMENTS_VIEW",
+    "search_comments",
+    "update_baseline",
+    "assess_reading",
+    "Storage",
+    "get_storage",
+    "MEASUREMENT_HEADERS",
+    "SQLiteStorage",
+    "InMemoryStorage",
+    "RecentReadingsCache"
 ]
\ No newline at end of file
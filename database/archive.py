@@ -0,0 +1,141 @@
+﻿# database/archive.py
+
+import os
+import sqlite3
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from db_config import DB_NAME, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_VACUUM_FREE_SHARE
+
+# Имя временного представления, объединяющего основную базу и все архивы
+ALL_MEASUREMENTS_VIEW = "all_pressure_measurements"
+
+MEASUREMENT_COLUMNS = "id, user_id, systolic, diastolic, pulse, comment1, timestamp"
+
+
+def archive_path(year):
+    """
+    Путь к архивному файлу за указанный год.
+    """
+    return Path(ARCHIVE_DIR) / f"data_{year}.db"
+
+
+def list_archives():
+    """
+    Возвращает список (год, путь) существующих архивов, отсортированный по году.
+    """
+    archives = []
+    for path in Path(ARCHIVE_DIR).glob("data_*.db"):
+        year = path.stem.split("_", 1)[1]
+        if year.isdigit():
+            archives.append((int(year), path))
+    return sorted(archives)
+
+
+def _create_archive_table(conn, schema):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.ad_pressure_measurements (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            systolic INTEGER NOT NULL,
+            diastolic INTEGER NOT NULL,
+            pulse INTEGER NOT NULL,
+            comment1 TEXT,
+            timestamp TEXT
+        )
+    """)
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS {schema}.idx_archive_user_ts
+            ON ad_pressure_measurements (user_id, timestamp)
+    """)
+
+
+def _free_share(conn):
+    """
+    Доля свободных страниц в файле основной базы.
+    """
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return freelist_count / page_count if page_count else 0.0
+
+
+def archive_old_records(days=ARCHIVE_AFTER_DAYS, db_name=DB_NAME):
+    """
+    Переносит измерения старше `days` дней в годовые архивы.
+    Перенос каждого года выполняется в одной транзакции: запись либо
+    уже в архиве, либо ещё в основной базе. Возвращает число перенесённых записей.
+    """
+    # Временные метки в базе — в UTC (CURRENT_TIMESTAMP)
+    cutoff = (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    conn = sqlite3.connect(db_name, isolation_level=None)
+    moved = 0
+    try:
+        years = [row[0] for row in conn.execute(
+            "SELECT DISTINCT strftime('%Y', timestamp) FROM ad_pressure_measurements "
+            "WHERE timestamp < ?",
+            (cutoff,)
+        )]
+
+        for year in years:
+            if year is None:
+                continue
+            conn.execute("ATTACH DATABASE ? AS arch", (str(archive_path(year)),))
+            try:
+                _create_archive_table(conn, "arch")
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO arch.ad_pressure_measurements ({MEASUREMENT_COLUMNS}) "
+                        f"SELECT {MEASUREMENT_COLUMNS} FROM main.ad_pressure_measurements "
+                        "WHERE timestamp < ? AND strftime('%Y', timestamp) = ?",
+                        (cutoff, year)
+                    )
+                    cursor = conn.execute(
+                        "DELETE FROM main.ad_pressure_measurements "
+                        "WHERE timestamp < ? AND strftime('%Y', timestamp) = ?",
+                        (cutoff, year)
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                moved += cursor.rowcount
+                logging.info("Архив %s: перенесено записей %s", year, cursor.rowcount)
+            finally:
+                conn.execute("DETACH DATABASE arch")
+
+        if moved and _free_share(conn) >= ARCHIVE_VACUUM_FREE_SHARE:
+            # VACUUM переписывает весь файл под эксклюзивной блокировкой, и вставки из обработчиков ждут.
+            # Ежедневный перенос освобождает немного страниц, их и так займут новые записи,
+            # поэтому сжимаем файл, только когда свободного места накопилось много
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return moved
+
+
+def connect_all_tiers(db_name=DB_NAME):
+    """
+    Открывает соединение с основной базой, подключает все годовые архивы через ATTACH
+    и создаёт временное представление all_pressure_measurements со всей историей.
+    Для запросов по последним данным достаточно обычного соединения с основной базой.
+    """
+    conn = sqlite3.connect(db_name)
+    selects = [f"SELECT {MEASUREMENT_COLUMNS} FROM main.ad_pressure_measurements"]
+    for year, path in list_archives():
+        schema = f"arch_{year}"
+        try:
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        except sqlite3.OperationalError as e:
+            # Например, превышен лимит подключённых баз — отдаём то, что удалось подключить
+            logging.error("Не удалось подключить архив %s: %s", path, e)
+            break
+        selects.append(f"SELECT {MEASUREMENT_COLUMNS} FROM {schema}.ad_pressure_measurements")
+
+    conn.execute(
+        f"CREATE TEMP VIEW {ALL_MEASUREMENTS_VIEW} AS " + " UNION ALL ".join(selects)
+    )
+    return conn
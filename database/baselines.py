@@ -0,0 +1,120 @@
+﻿# database/baselines.py
+
+import math
+
+# Показатели, по которым ведётся личная норма
+BASELINE_FIELDS = ("systolic", "diastolic", "pulse")
+BASELINE_LABELS = {"systolic": "Верхнее давление", "diastolic": "Нижнее давление", "pulse": "Пульс"}
+
+# Сравнивать с личной нормой, только когда накоплено достаточно записей
+BASELINE_MIN_COUNT = 10
+# Отклонение от нормы: не меньше стольких стандартных отклонений...
+BASELINE_Z_THRESHOLD = 2.5
+# ...и не меньше абсолютной разницы (чтобы не срабатывать при очень стабильных значениях)
+BASELINE_MIN_DELTA = {"systolic": 15, "diastolic": 10, "pulse": 15}
+
+# Клинические пороги
+CRISIS_SYSTOLIC = 180
+CRISIS_DIASTOLIC = 120
+HIGH_SYSTOLIC = 140
+HIGH_DIASTOLIC = 90
+LOW_SYSTOLIC = 90
+LOW_DIASTOLIC = 60
+HIGH_PULSE = 100
+LOW_PULSE = 50
+
+
+_SELECT_BASELINE = (
+    "SELECT n, systolic_mean, systolic_m2, diastolic_mean, diastolic_m2, pulse_mean, pulse_m2 "
+    "FROM ad_user_baselines WHERE user_id = ?"
+)
+
+
+def baseline_from_row(row):
+    """
+    Строка (n, systolic_mean, systolic_m2, ...) -> {"n": ..., "systolic": (mean, std), ...}.
+    """
+    if row is None:
+        return None
+    n = row[0]
+    baseline = {"n": n}
+    for i, field in enumerate(BASELINE_FIELDS):
+        mean, m2 = row[1 + 2 * i], row[2 + 2 * i]
+        baseline[field] = (mean, math.sqrt(max(m2, 0.0) / (n - 1)) if n > 1 else 0.0)
+    return baseline
+
+
+def get_baseline(cursor, user_id):
+    """
+    Возвращает личную норму пользователя: {"n": ..., "systolic": (mean, std), ...} или None.
+    """
+    cursor.execute(_SELECT_BASELINE, (user_id,))
+    return baseline_from_row(cursor.fetchone())
+
+
+def welford_step(row, systolic, diastolic, pulse):
+    """
+    Одно обновление по алгоритму Уэлфорда: возвращает новую строку
+    (n, systolic_mean, systolic_m2, diastolic_mean, diastolic_m2, pulse_mean, pulse_m2).
+    """
+    n = row[0] if row else 0
+    stats = list(row[1:]) if row else [0.0] * 6
+    n += 1
+    for i, value in enumerate((systolic, diastolic, pulse)):
+        mean, m2 = stats[2 * i], stats[2 * i + 1]
+        delta = value - mean
+        mean += delta / n
+        m2 += delta * (value - mean)
+        stats[2 * i], stats[2 * i + 1] = mean, m2
+    return (n, *stats)
+
+
+def update_baseline(cursor, user_id, systolic, diastolic, pulse):
+    """
+    Добавляет измерение в личную норму за O(1) (алгоритм Уэлфорда).
+    Вызывать в той же транзакции, что и INSERT измерения.
+    Возвращает норму до учёта нового измерения (или None, если её не было).
+    """
+    cursor.execute(_SELECT_BASELINE, (user_id,))
+    row = cursor.fetchone()
+    previous = baseline_from_row(row)
+
+    cursor.execute(
+        "INSERT OR REPLACE INTO ad_user_baselines "
+        "(user_id, n, systolic_mean, systolic_m2, diastolic_mean, diastolic_m2, pulse_mean, pulse_m2, updated_dt) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+        (user_id, *welford_step(row, systolic, diastolic, pulse))
+    )
+    return previous
+
+
+def assess_reading(baseline, systolic, diastolic, pulse):
+    """
+    Проверяет измерение по клиническим порогам и по личной норме.
+    Возвращает список предупреждений (пустой, если всё в порядке).
+    """
+    alerts = []
+
+    if systolic >= CRISIS_SYSTOLIC or diastolic >= CRISIS_DIASTOLIC:
+        alerts.append("🚨 Очень высокое давление. Если самочувствие плохое — обратитесь за медицинской помощью.")
+    elif systolic >= HIGH_SYSTOLIC or diastolic >= HIGH_DIASTOLIC:
+        alerts.append("⚠️ Давление выше нормы (≥ 140/90).")
+    elif systolic < LOW_SYSTOLIC or diastolic < LOW_DIASTOLIC:
+        alerts.append("⚠️ Давление ниже нормы (< 90/60).")
+
+    if pulse > HIGH_PULSE:
+        alerts.append(f"⚠️ Учащённый пульс (> {HIGH_PULSE}).")
+    elif pulse < LOW_PULSE:
+        alerts.append(f"⚠️ Редкий пульс (< {LOW_PULSE}).")
+
+    if baseline is not None and baseline["n"] >= BASELINE_MIN_COUNT:
+        for field, value in zip(BASELINE_FIELDS, (systolic, diastolic, pulse)):
+            mean, std = baseline[field]
+            delta = value - mean
+            if std > 0 and abs(delta) >= BASELINE_Z_THRESHOLD * std and abs(delta) >= BASELINE_MIN_DELTA[field]:
+                direction = "выше" if delta > 0 else "ниже"
+                alerts.append(
+                    f"📊 {BASELINE_LABELS[field]} {value} заметно {direction} вашей обычной "
+                    f"нормы ({mean:.0f} ± {std:.0f})."
+                )
+    return alerts
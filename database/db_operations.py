@@ -1,66 +1,44 @@
 ﻿# database/db_operations.py
+# Функции для работы с данными поверх хранилища по умолчанию (см. storage.get_storage)
 
-import sqlite3
-from datetime import datetime
+from .storage import get_storage
+
+_storage = None
+
+
+def _default_storage():
+    global _storage
+    if _storage is None:
+        _storage = get_storage()
+    return _storage
 
-DB_NAME = "data.db"
 
 def get_user(user_id):
     """
     Получает данные пользователя из базы данных.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM ad_users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return _default_storage().get_user(user_id)
 
 
 def register_user(user_id, phone=None):
     """
     Регистрирует нового пользователя в базе данных.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR IGNORE INTO ad_users (user_id, phone) VALUES (?, ?)",
-        (user_id, phone)
-    )
-    conn.commit()
-    conn.close()
+    _default_storage().register_user(user_id, phone)
 
 
 def save_pressure_record(user_id, systolic, diastolic, pulse, comment=None):
     """
     Сохраняет новую запись давления в базу данных.
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO ad_pressure_measurements (user_id, systolic, diastolic, pulse, comment1, timestamp) "
-        "VALUES (?, ?, ?, ?, ?, ?)",
-        (user_id, systolic, diastolic, pulse, comment, timestamp)
-    )
-    conn.commit()
-    conn.close()
+    _default_storage().add_measurement(user_id, systolic, diastolic, pulse, comment)
 
 
 def get_user_records(user_id, limit=10):
     """
     Получает последние записи пользователя из базы данных.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT systolic, diastolic, pulse, comment1, timestamp FROM ad_pressure_measurements "
-        "WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
-        (user_id, limit)
-    )
-    records = cursor.fetchall()
-    conn.close()
-    return records
+    return _default_storage().recent_measurements(user_id, limit)
 
 
 def update_user_data(user_id, **kwargs):
@@ -68,9 +46,4 @@ def update_user_data(user_id, **kwargs):
     Обновляет данные пользователя в базе данных.
     Пример: update_user_data(user_id, interface_version="1.1.1")
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    for key, value in kwargs.items():
-        cursor.execute(f"UPDATE ad_users SET {key} = ? WHERE user_id = ?", (value, user_id))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    _default_storage().update_user(user_id, **kwargs)
\ No newline at end of file
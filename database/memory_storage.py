@@ -0,0 +1,181 @@
+﻿# database/memory_storage.py
+
+import bisect
+import threading
+from array import array
+
+from .storage import Storage, check_user_fields, current_timestamp
+from .baselines import baseline_from_row, welford_step
+from .search import WORD_RE, SEARCH_PAGE_SIZE
+
+
+class InMemoryStorage(Storage):
+    """
+    Хранилище в памяти процесса для тестов и нагрузочных замеров.
+    Измерения лежат по столбцам в типизированных массивах (array), у каждого
+    пользователя — массив номеров его строк в порядке добавления.
+    Данные не сохраняются между запусками.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}  # user_id -> [phone, interface_version]
+
+        # int64, как INTEGER в SQLite: всё, что принимает SQLiteStorage, помещается и сюда
+        self._user_ids = array("q")
+        self._systolic = array("q")
+        self._diastolic = array("q")
+        self._pulse = array("q")
+        self._timestamps = []  # строки storage.TIMESTAMP_FORMAT, сортируются как время
+        self._comments = []
+
+        self._rows_by_user = {}  # user_id -> array("l") номеров строк
+        self._baselines = {}  # user_id -> строка для baseline_from_row
+
+    # Пользователи
+
+    def get_user(self, user_id):
+        with self._lock:
+            user = self._users.get(user_id)
+            return (user_id, *user) if user else None
+
+    def register_user(self, user_id, phone=None):
+        with self._lock:
+            self._users.setdefault(user_id, [phone, "1.0"])
+
+    def update_user(self, user_id, **fields):
+        check_user_fields(fields)
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._apply_user_fields(user, fields)
+
+    def update_all_users(self, **fields):
+        check_user_fields(fields)
+        with self._lock:
+            for user in self._users.values():
+                self._apply_user_fields(user, fields)
+
+    @staticmethod
+    def _apply_user_fields(user, fields):
+        if "phone" in fields:
+            user[0] = fields["phone"]
+        if "interface_version" in fields:
+            user[1] = fields["interface_version"]
+
+    def list_user_ids(self):
+        with self._lock:
+            return list(self._users)
+
+    def active_user_ids(self, since):
+        with self._lock:
+            # Строки пользователя идут по времени — достаточно проверить последнюю
+            return [
+                user_id for user_id, rows in self._rows_by_user.items()
+                if self._timestamps[rows[-1]] >= since
+            ]
+
+    # Измерения
+
+    def add_measurement(self, user_id, systolic, diastolic, pulse, comment=None, timestamp=None):
+        # Проверяем типы и диапазон до изменения столбцов, иначе они разъедутся по длине
+        values = array("q", (user_id, systolic, diastolic, pulse))
+        with self._lock:
+            row = len(self._user_ids)
+            self._user_ids.append(values[0])
+            self._systolic.append(values[1])
+            self._diastolic.append(values[2])
+            self._pulse.append(values[3])
+            self._timestamps.append(timestamp or current_timestamp())
+            self._comments.append(comment)
+            self._rows_by_user.setdefault(user_id, array("l")).append(row)
+
+            previous = self._baselines.get(user_id)
+            self._baselines[user_id] = welford_step(previous, systolic, diastolic, pulse)
+            return baseline_from_row(previous)
+
+    def _row(self, row):
+        return (
+            self._systolic[row], self._diastolic[row], self._pulse[row],
+            self._comments[row], self._timestamps[row]
+        )
+
+    def recent_measurements(self, user_id, limit=10):
+        with self._lock:
+            rows = self._rows_by_user.get(user_id, ())
+            return [self._row(row) for row in reversed(rows[-limit:])] if limit > 0 else []
+
+    def measurements_range(self, user_id, start=None, end=None):
+        with self._lock:
+            rows = self._rows_by_user.get(user_id, array("l"))
+            # Строки пользователя добавляются по времени — ищем границы двоичным поиском
+            key = self._timestamps.__getitem__
+            lo = bisect.bisect_left(rows, start, key=key) if start is not None else 0
+            hi = bisect.bisect_left(rows, end, key=key) if end is not None else len(rows)
+            return [
+                (self._timestamps[row], self._systolic[row], self._diastolic[row],
+                 self._pulse[row], self._comments[row])
+                for row in rows[lo:hi]
+            ]
+
+    def measurements_since(self, user_ids, since):
+        result = {}
+        for user_id in user_ids:
+            rows = self.measurements_range(user_id, since)
+            if rows:
+                result[user_id] = rows
+        return result
+
+    def all_measurements(self):
+        with self._lock:
+            return [
+                (row + 1, self._user_ids[row], self._systolic[row], self._diastolic[row],
+                 self._pulse[row], self._comments[row], self._timestamps[row])
+                for row in range(len(self._user_ids))
+            ]
+
+    def search_comments(self, user_id, text, before_id=None, limit=SEARCH_PAGE_SIZE):
+        words = [word.lower() for word in WORD_RE.findall(text)]
+        if not words:
+            return [], None
+
+        found = []
+        with self._lock:
+            for row in reversed(self._rows_by_user.get(user_id, ())):
+                record_id = row + 1
+                if before_id is not None and record_id >= before_id:
+                    continue
+                comment = self._comments[row]
+                if not comment:
+                    continue
+                tokens = [token.lower() for token in WORD_RE.findall(comment)]
+                # Как в FTS-запросе: каждое слово должно быть префиксом какого-то слова комментария
+                if all(any(token.startswith(word) for token in tokens) for word in words):
+                    found.append((record_id, *self._row(row)))
+                    if len(found) > limit:
+                        break
+
+        next_before_id = found[limit - 1][0] if len(found) > limit else None
+        return found[:limit], next_before_id
+
+    # Агрегаты
+
+    def get_baseline(self, user_id):
+        with self._lock:
+            return baseline_from_row(self._baselines.get(user_id))
+
+    def user_day_aggregates(self):
+        with self._lock:
+            result = []
+            for user_id in self._users:
+                days = {}
+                for row in self._rows_by_user.get(user_id, ()):
+                    day = days.setdefault(self._timestamps[row][:10], [0, 0, 0, 0])
+                    day[0] += 1
+                    day[1] += self._systolic[row]
+                    day[2] += self._diastolic[row]
+                    day[3] += self._pulse[row]
+                if not days:
+                    result.append((user_id, None, None, None, None, None))
+                result.extend((user_id, day, *sums) for day, sums in days.items())
+            return result
@@ -1 +1,103 @@
-﻿
\ No newline at end of file
+﻿# database/migrations.py
+
+import sqlite3
+import logging
+from db_config import DB_NAME
+
+# Список миграций: (версия, описание, SQL).
+# Версия схемы хранится в PRAGMA user_version, каждая миграция применяется один раз.
+MIGRATIONS = [
+    (
+        1,
+        "Индекс по пользователю и времени измерения",
+        """
+        CREATE INDEX IF NOT EXISTS idx_measurements_user_ts
+            ON ad_pressure_measurements (user_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_measurements_ts
+            ON ad_pressure_measurements (timestamp);
+        """,
+    ),
+    (
+        2,
+        "Полнотекстовый поиск по комментариям (FTS5)",
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS ad_measurements_fts USING fts5(
+            comment1,
+            user_id,
+            content='ad_pressure_measurements',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        );
+        INSERT INTO ad_measurements_fts (ad_measurements_fts) VALUES ('rebuild');
+
+        CREATE TRIGGER IF NOT EXISTS ad_measurements_fts_ai
+        AFTER INSERT ON ad_pressure_measurements BEGIN
+            INSERT INTO ad_measurements_fts (rowid, comment1, user_id)
+            VALUES (new.id, new.comment1, new.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS ad_measurements_fts_ad
+        AFTER DELETE ON ad_pressure_measurements BEGIN
+            INSERT INTO ad_measurements_fts (ad_measurements_fts, rowid, comment1, user_id)
+            VALUES ('delete', old.id, old.comment1, old.user_id);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS ad_measurements_fts_au
+        AFTER UPDATE OF comment1, user_id ON ad_pressure_measurements BEGIN
+            INSERT INTO ad_measurements_fts (ad_measurements_fts, rowid, comment1, user_id)
+            VALUES ('delete', old.id, old.comment1, old.user_id);
+            INSERT INTO ad_measurements_fts (rowid, comment1, user_id)
+            VALUES (new.id, new.comment1, new.user_id);
+        END;
+        """,
+    ),
+    (
+        3,
+        "Личная норма пользователя: накопительная статистика (алгоритм Уэлфорда)",
+        """
+        CREATE TABLE IF NOT EXISTS ad_user_baselines (
+            user_id INTEGER PRIMARY KEY,
+            n INTEGER NOT NULL,
+            systolic_mean REAL NOT NULL,
+            systolic_m2 REAL NOT NULL,
+            diastolic_mean REAL NOT NULL,
+            diastolic_m2 REAL NOT NULL,
+            pulse_mean REAL NOT NULL,
+            pulse_m2 REAL NOT NULL,
+            updated_dt TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT OR REPLACE INTO ad_user_baselines (
+            user_id, n,
+            systolic_mean, systolic_m2,
+            diastolic_mean, diastolic_m2,
+            pulse_mean, pulse_m2
+        )
+        SELECT
+            user_id, COUNT(*),
+            AVG(systolic), SUM(systolic * systolic) - COUNT(*) * AVG(systolic) * AVG(systolic),
+            AVG(diastolic), SUM(diastolic * diastolic) - COUNT(*) * AVG(diastolic) * AVG(diastolic),
+            AVG(pulse), SUM(pulse * pulse) - COUNT(*) * AVG(pulse) * AVG(pulse)
+        FROM ad_pressure_measurements
+        GROUP BY user_id;
+        """,
+    ),
+]
+
+
+def apply_migrations(db_name=DB_NAME):
+    """
+    Применяет к базе все миграции, версия которых больше текущей user_version.
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, sql in MIGRATIONS:
+            if version <= current:
+                continue
+            logging.info("Применяю миграцию %s: %s", version, description)
+            conn.executescript(f"BEGIN; {sql} PRAGMA user_version = {version}; COMMIT;")
+            current = version
+    finally:
+        conn.close()
+    return current
@@ -0,0 +1,232 @@
+﻿# database/recent_cache.py
+
+import sys
+import time
+import calendar
+import threading
+from array import array
+from collections import OrderedDict
+
+from db_config import RECENT_CACHE_SIZE, RECENT_CACHE_IDLE_SECONDS, RECENT_CACHE_MAX_BYTES
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Диапазон array("h"); записи с другими значениями не кэшируются
+VALUE_MIN, VALUE_MAX = -32768, 32767
+
+
+def _to_epoch(timestamp):
+    return calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT))
+
+
+def _from_epoch(seconds):
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+
+def _fits(systolic, diastolic, pulse):
+    return all(isinstance(value, int) and VALUE_MIN <= value <= VALUE_MAX for value in (systolic, diastolic, pulse))
+
+
+class _RingBuffer:
+    """
+    Последние size измерений одного пользователя в массивах фиксированного размера.
+    values — тройки (верхнее, нижнее, пульс) подряд, timestamps — секунды UTC.
+    Список комментариев заводится, только когда встречается первый комментарий.
+    """
+
+    __slots__ = ("values", "timestamps", "comments", "head", "count", "last_used", "nbytes")
+
+    def __init__(self, size):
+        self.values = array("h", bytes(2 * 3 * size))
+        self.timestamps = array("I", bytes(4 * size))
+        self.comments = None
+        self.head = 0  # Куда будет записано следующее измерение
+        self.count = 0
+        self.last_used = time.monotonic()
+        self.nbytes = 0
+
+    def push(self, systolic, diastolic, pulse, comment, timestamp):
+        size = len(self.timestamps)
+        i = self.head
+        self.values[3 * i] = systolic
+        self.values[3 * i + 1] = diastolic
+        self.values[3 * i + 2] = pulse
+        self.timestamps[i] = timestamp
+        if comment is not None and self.comments is None:
+            self.comments = [None] * size
+        if self.comments is not None:
+            self.comments[i] = comment
+        self.head = (i + 1) % size
+        self.count = min(self.count + 1, size)
+
+    def newest_timestamp(self):
+        return self.timestamps[self.head - 1] if self.count else None
+
+    def rows(self, limit):
+        """
+        Измерения от новых к старым в формате Storage.recent_measurements.
+        """
+        size = len(self.timestamps)
+        result = []
+        for k in range(1, min(limit, self.count) + 1):
+            i = (self.head - k) % size
+            result.append((
+                self.values[3 * i], self.values[3 * i + 1], self.values[3 * i + 2],
+                self.comments[i] if self.comments is not None else None,
+                _from_epoch(self.timestamps[i])
+            ))
+        return result
+
+    def size_bytes(self):
+        nbytes = (
+            sys.getsizeof(self) + sys.getsizeof(self.values) + sys.getsizeof(self.timestamps)
+        )
+        if self.comments is not None:
+            nbytes += sys.getsizeof(self.comments) + sum(
+                sys.getsizeof(comment) for comment in self.comments if comment is not None
+            )
+        return nbytes
+
+
+class RecentReadingsCache:
+    """
+    Кэш последних измерений активных пользователей для "📋 Последние записи" и /send_last_records.
+    Заполняется из базы при первом обращении, новые записи добавляются сквозной записью.
+    Пользователи, к которым не обращались idle_seconds, вытесняются;
+    при превышении max_bytes вытесняются давно не использовавшиеся.
+    """
+
+    def __init__(self, size=RECENT_CACHE_SIZE, idle_seconds=RECENT_CACHE_IDLE_SECONDS, max_bytes=RECENT_CACHE_MAX_BYTES):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()  # user_id -> _RingBuffer, от давно использованных к недавним
+        self._lock = threading.Lock()
+        self._nbytes = 0
+        self._writes = 0  # Счётчик записей: заполнение из базы не должно перетереть более новую запись
+        self._writing = {}  # user_id -> число вставок, начатых, но ещё не добавленных в кэш
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, limit):
+        """
+        Последние limit измерений (limit <= size) или None, если пользователя нет в кэше.
+        """
+        with self._lock:
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                self.misses += 1
+                self._evict()
+                return None
+            self.hits += 1
+            buffer.last_used = time.monotonic()
+            self._buffers.move_to_end(user_id)
+            return buffer.rows(limit)
+
+    def write_version(self):
+        with self._lock:
+            return self._writes
+
+    def fill(self, user_id, rows, version):
+        """
+        Кладёт в кэш измерения из базы (от новых к старым, не больше size).
+        version — write_version() до чтения из базы: если с тех пор были записи
+        или вставка пользователя ещё не завершена (см. begin_write), не кэшируем.
+        Пользователь с значениями вне диапазона массива в кэш не попадает — читается из базы.
+        """
+        buffer = _RingBuffer(self.size)
+        for systolic, diastolic, pulse, comment, timestamp in reversed(rows[:self.size]):
+            if not _fits(systolic, diastolic, pulse):
+                return
+            buffer.push(systolic, diastolic, pulse, comment, _to_epoch(timestamp))
+        buffer.nbytes = buffer.size_bytes()
+
+        with self._lock:
+            if version != self._writes or user_id in self._writing or user_id in self._buffers:
+                return
+            self._buffers[user_id] = buffer
+            self._nbytes += buffer.nbytes
+            self._evict()
+
+    def begin_write(self, user_id):
+        """
+        Вызывается до вставки в базу. Пока вставка не завершена add() или cancel_write(),
+        fill() не кладёт пользователя в кэш: прочитанная из базы новая строка
+        иначе попала бы в буфер второй раз при add().
+        """
+        with self._lock:
+            self._writes += 1
+            self._writing[user_id] = self._writing.get(user_id, 0) + 1
+
+    def cancel_write(self, user_id):
+        """
+        Вставка, начатая begin_write(), не удалась.
+        """
+        with self._lock:
+            self._writes += 1
+            self._end_write(user_id)
+
+    def add(self, user_id, systolic, diastolic, pulse, comment, timestamp):
+        """
+        Сквозная запись нового измерения после вставки в базу; завершает begin_write().
+        Если пользователя нет в кэше, он заполнится при чтении.
+        """
+        with self._lock:
+            self._end_write(user_id)
+            self._writes += 1
+            seconds = _to_epoch(timestamp)
+            buffer = self._buffers.get(user_id)
+            if buffer is None:
+                return
+            newest = buffer.newest_timestamp()
+            if (newest is not None and seconds < newest) or not _fits(systolic, diastolic, pulse):
+                # Запись пришла не по порядку (параллельные вставки) или не помещается в массив —
+                # убираем пользователя из кэша, дальше он читается из базы
+                self._remove(user_id)
+                return
+            buffer.push(systolic, diastolic, pulse, comment, seconds)
+            buffer.last_used = time.monotonic()
+            self._buffers.move_to_end(user_id)
+            if comment is not None or buffer.comments is not None:
+                self._nbytes -= buffer.nbytes
+                buffer.nbytes = buffer.size_bytes()
+                self._nbytes += buffer.nbytes
+            self._evict()
+
+    def discard(self, user_id):
+        """
+        Убирает пользователя из кэша; заполнение из базы, начатое раньше, тоже отбрасывается.
+        """
+        with self._lock:
+            self._writes += 1
+            if user_id in self._buffers:
+                self._remove(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._buffers.clear()
+            self._nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._buffers), "bytes": self._nbytes, "hits": self.hits, "misses": self.misses}
+
+    def _end_write(self, user_id):
+        count = self._writing.get(user_id, 0)
+        if count > 1:
+            self._writing[user_id] = count - 1
+        else:
+            self._writing.pop(user_id, None)
+
+    def _remove(self, user_id):
+        self._nbytes -= self._buffers.pop(user_id).nbytes
+
+    def _evict(self):
+        # Порядок OrderedDict — по времени последнего обращения, поэтому смотрим только начало
+        idle_before = time.monotonic() - self.idle_seconds
+        while self._buffers:
+            user_id, buffer = next(iter(self._buffers.items()))
+            if buffer.last_used >= idle_before and self._nbytes <= self.max_bytes:
+                break
+            self._remove(user_id)
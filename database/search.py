@@ -0,0 +1,52 @@
+﻿# database/search.py
+
+import re
+import sqlite3
+
+from db_config import DB_NAME
+
+SEARCH_PAGE_SIZE = 10
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def build_fts_query(user_id, text):
+    """
+    Превращает произвольный текст пользователя в безопасный запрос FTS5:
+    каждое слово ищется по префиксу, все слова обязательны,
+    поиск ограничен записями пользователя. Возвращает None, если слов нет.
+    """
+    words = WORD_RE.findall(text)
+    if not words:
+        return None
+    terms = " AND ".join(f'"{word}"*' for word in words)
+    return f'user_id:"{int(user_id)}" AND comment1:({terms})'
+
+
+def search_comments(user_id, text, before_id=None, limit=SEARCH_PAGE_SIZE, db_name=DB_NAME):
+    """
+    Ищет записи пользователя по комментарию, от новых к старым.
+    Пагинация по id (before_id — id последней показанной записи), без OFFSET.
+    Возвращает (записи, id для следующей страницы или None).
+    Ищутся только записи основной базы; перенесённые в архив не индексируются.
+    """
+    query = build_fts_query(user_id, text)
+    if query is None:
+        return [], None
+
+    conn = sqlite3.connect(db_name)
+    try:
+        cursor = conn.execute(
+            "SELECT m.id, m.systolic, m.diastolic, m.pulse, m.comment1, m.timestamp "
+            "FROM ad_measurements_fts f "
+            "JOIN ad_pressure_measurements m ON m.id = f.rowid "
+            "WHERE ad_measurements_fts MATCH ? AND f.rowid < ? "
+            "ORDER BY f.rowid DESC LIMIT ?",
+            (query, before_id if before_id is not None else 2 ** 63 - 1, limit + 1)
+        )
+        rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    next_before_id = rows[limit - 1][0] if len(rows) > limit else None
+    return rows[:limit], next_before_id
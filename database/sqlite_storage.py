@@ -0,0 +1,248 @@
+﻿# database/sqlite_storage.py
+
+import logging
+import sqlite3
+
+from db_config import DB_NAME, ARCHIVE_AFTER_DAYS
+from .storage import Storage, check_user_fields, current_timestamp
+from .archive import archive_old_records, connect_all_tiers, ALL_MEASUREMENTS_VIEW
+from .baselines import get_baseline, update_baseline
+from .search import search_comments, SEARCH_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteStorage(Storage):
+    """
+    Хранилище на SQLite: основная база DB_NAME и годовые архивы.
+    Каждый вызов открывает своё соединение, поэтому методы можно вызывать из разных потоков.
+    recent_cache (RecentReadingsCache) — необязательный кэш последних измерений:
+    recent_measurements читает из него, add_measurement пишет в него сквозной записью.
+    """
+
+    def __init__(self, db_name=DB_NAME, recent_cache=None):
+        self.db_name = db_name
+        self.recent_cache = recent_cache
+
+    def _connect(self):
+        return sqlite3.connect(self.db_name)
+
+    # Пользователи
+
+    def get_user(self, user_id):
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT user_id, phone, interface_version FROM ad_users WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+    def register_user(self, user_id, phone=None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR IGNORE INTO ad_users (user_id, phone) VALUES (?, ?)",
+                (user_id, phone)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def update_user(self, user_id, **fields):
+        check_user_fields(fields)
+        if not fields:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE ad_users SET {assignments} WHERE user_id = ?",
+                (*fields.values(), user_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def update_all_users(self, **fields):
+        check_user_fields(fields)
+        if not fields:
+            return
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE ad_users SET {assignments}", tuple(fields.values()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def list_user_ids(self):
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT user_id FROM ad_users")]
+        finally:
+            conn.close()
+
+    def active_user_ids(self, since):
+        # Свежие измерения всегда в основной базе, архивы не нужны
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute(
+                "SELECT DISTINCT user_id FROM ad_pressure_measurements WHERE timestamp >= ?",
+                (since,)
+            )]
+        finally:
+            conn.close()
+
+    # Измерения
+
+    def add_measurement(self, user_id, systolic, diastolic, pulse, comment=None, timestamp=None):
+        # Время задаём сами, чтобы в базе и в кэше оно совпадало
+        timestamp = timestamp or current_timestamp()
+        cache = self.recent_cache
+        if cache is not None:
+            # До вставки: промах кэша в другом потоке не должен закэшировать строку, которую потом добавит add()
+            cache.begin_write(user_id)
+        try:
+            conn = self._connect()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "INSERT INTO ad_pressure_measurements (user_id, systolic, diastolic, pulse, comment1, timestamp) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, systolic, diastolic, pulse, comment, timestamp)
+                )
+                # Норма обновляется в той же транзакции, что и вставка
+                baseline = update_baseline(cursor, user_id, systolic, diastolic, pulse)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception:
+            if cache is not None:
+                cache.cancel_write(user_id)
+            raise
+
+        if cache is not None:
+            # Запись уже в базе: ошибка кэша не должна её "отменять"
+            try:
+                cache.add(user_id, systolic, diastolic, pulse, comment, timestamp)
+            except Exception:
+                logger.exception(f"Ошибка кэша последних записей, пользователь {user_id} сброшен")
+                cache.discard(user_id)
+        return baseline
+
+    def recent_measurements(self, user_id, limit=10):
+        cache = self.recent_cache
+        if cache is None or limit > cache.size:
+            return self._select_recent(user_id, limit)
+
+        rows = cache.get(user_id, limit)
+        if rows is None:
+            # Промах: читаем из базы сразу на весь буфер и кладём в кэш
+            version = cache.write_version()
+            rows = self._select_recent(user_id, cache.size)
+            try:
+                cache.fill(user_id, rows, version)
+            except Exception:
+                logger.exception(f"Не удалось заполнить кэш последних записей для пользователя {user_id}")
+            rows = rows[:limit]
+        return rows
+
+    def _select_recent(self, user_id, limit):
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "SELECT systolic, diastolic, pulse, comment1, timestamp FROM ad_pressure_measurements "
+                "WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def measurements_range(self, user_id, start=None, end=None):
+        conditions, params = ["user_id = ?"], [user_id]
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+
+        # Полная история: основная база и годовые архивы
+        conn = connect_all_tiers(self.db_name)
+        try:
+            return conn.execute(
+                f"SELECT timestamp, systolic, diastolic, pulse, comment1 FROM {ALL_MEASUREMENTS_VIEW} "
+                f"WHERE {' AND '.join(conditions)} ORDER BY timestamp",
+                params
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def measurements_since(self, user_ids, since):
+        # Свежие измерения всегда в основной базе: одно соединение без ATTACH архивов
+        result = {}
+        if not user_ids:
+            return result
+        placeholders = ", ".join("?" * len(user_ids))
+        conn = self._connect()
+        try:
+            for user_id, *row in conn.execute(
+                "SELECT user_id, timestamp, systolic, diastolic, pulse, comment1 FROM ad_pressure_measurements "
+                f"WHERE user_id IN ({placeholders}) AND timestamp >= ? ORDER BY user_id, timestamp",
+                (*user_ids, since)
+            ):
+                result.setdefault(user_id, []).append(tuple(row))
+        finally:
+            conn.close()
+        return result
+
+    def all_measurements(self):
+        # Полная выгрузка: основная база и годовые архивы
+        conn = connect_all_tiers(self.db_name)
+        try:
+            return conn.execute(
+                f"SELECT id, user_id, systolic, diastolic, pulse, comment1, timestamp FROM {ALL_MEASUREMENTS_VIEW} "
+                "ORDER BY id"
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def search_comments(self, user_id, text, before_id=None, limit=SEARCH_PAGE_SIZE):
+        return search_comments(user_id, text, before_id, limit, db_name=self.db_name)
+
+    # Агрегаты
+
+    def get_baseline(self, user_id):
+        conn = self._connect()
+        try:
+            return get_baseline(conn.cursor(), user_id)
+        finally:
+            conn.close()
+
+    def user_day_aggregates(self):
+        # Один проход по всем измерениям, включая архивы
+        conn = connect_all_tiers(self.db_name)
+        try:
+            return conn.execute(f"""
+                SELECT u.user_id, m.day, m.cnt, m.sys_sum, m.dia_sum, m.pulse_sum
+                FROM ad_users u
+                LEFT JOIN (
+                    SELECT user_id, date(timestamp) AS day, COUNT(*) AS cnt,
+                           SUM(systolic) AS sys_sum, SUM(diastolic) AS dia_sum, SUM(pulse) AS pulse_sum
+                    FROM {ALL_MEASUREMENTS_VIEW}
+                    GROUP BY user_id, day
+                ) m ON m.user_id = u.user_id
+            """).fetchall()
+        finally:
+            conn.close()
+
+    # Обслуживание
+
+    def archive_old_records(self, days=ARCHIVE_AFTER_DAYS):
+        moved = archive_old_records(days, db_name=self.db_name)
+        if moved and self.recent_cache is not None:
+            # Перенесённые записи могли оставаться в кэше
+            self.recent_cache.clear()
+        return moved
@@ -0,0 +1,156 @@
+﻿# database/storage.py
+
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+from db_config import STORAGE_BACKEND, ARCHIVE_AFTER_DAYS, RECENT_CACHE_SIZE
+from .search import SEARCH_PAGE_SIZE
+
+# Поля пользователя, которые можно менять через update_user
+USER_COLUMNS = ("phone", "interface_version")
+
+# Колонки полной выгрузки измерений (/export_csv)
+MEASUREMENT_HEADERS = ["id", "user_id", "systolic", "diastolic", "pulse", "comment1", "timestamp"]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def current_timestamp():
+    # Как CURRENT_TIMESTAMP в SQLite: UTC с точностью до секунды
+    return datetime.now(timezone.utc).replace(tzinfo=None).strftime(TIMESTAMP_FORMAT)
+
+
+class Storage(ABC):
+    """
+    Интерфейс хранилища пользователей и измерений.
+    Обработчики бота работают только через него, поэтому хранилище можно подменить
+    (например, InMemoryStorage для тестов и замеров без дискового ввода-вывода).
+    Временные метки — строки "%Y-%m-%d %H:%M:%S".
+    """
+
+    # Пользователи
+
+    @abstractmethod
+    def get_user(self, user_id):
+        """
+        Возвращает (user_id, phone, interface_version) или None.
+        """
+
+    @abstractmethod
+    def register_user(self, user_id, phone=None):
+        """
+        Регистрирует пользователя, если его ещё нет.
+        """
+
+    @abstractmethod
+    def update_user(self, user_id, **fields):
+        """
+        Обновляет поля пользователя (только из USER_COLUMNS).
+        """
+
+    @abstractmethod
+    def update_all_users(self, **fields):
+        """
+        Обновляет поля у всех пользователей (только из USER_COLUMNS).
+        """
+
+    @abstractmethod
+    def list_user_ids(self):
+        """
+        Список id всех пользователей.
+        """
+
+    @abstractmethod
+    def active_user_ids(self, since):
+        """
+        Список id пользователей, у которых есть измерения не раньше since.
+        """
+
+    # Измерения
+
+    @abstractmethod
+    def add_measurement(self, user_id, systolic, diastolic, pulse, comment=None, timestamp=None):
+        """
+        Сохраняет измерение (по умолчанию с текущим временем, см. current_timestamp)
+        и обновляет личную норму пользователя.
+        Возвращает норму до учёта этого измерения (см. baselines.baseline_from_row) или None.
+        """
+
+    @abstractmethod
+    def recent_measurements(self, user_id, limit=10):
+        """
+        Последние измерения пользователя, от новых к старым:
+        [(systolic, diastolic, pulse, comment, timestamp), ...].
+        """
+
+    @abstractmethod
+    def measurements_range(self, user_id, start=None, end=None):
+        """
+        Измерения пользователя за всю историю (включая архив) в интервале [start, end),
+        от старых к новым: [(timestamp, systolic, diastolic, pulse, comment), ...].
+        """
+
+    @abstractmethod
+    def measurements_since(self, user_ids, since):
+        """
+        Свежие измерения группы пользователей (не раньше since, без архива) за один запрос,
+        от старых к новым: {user_id: [(timestamp, systolic, diastolic, pulse, comment), ...]}.
+        Пользователи без таких измерений в результат не попадают.
+        """
+
+    @abstractmethod
+    def all_measurements(self):
+        """
+        Все измерения, включая архив, в порядке MEASUREMENT_HEADERS.
+        """
+
+    @abstractmethod
+    def search_comments(self, user_id, text, before_id=None, limit=SEARCH_PAGE_SIZE):
+        """
+        Поиск по комментариям пользователя, от новых к старым:
+        ([(id, systolic, diastolic, pulse, comment, timestamp), ...], id для следующей страницы или None).
+        """
+
+    # Агрегаты
+
+    @abstractmethod
+    def get_baseline(self, user_id):
+        """
+        Личная норма пользователя или None.
+        """
+
+    @abstractmethod
+    def user_day_aggregates(self):
+        """
+        Агрегаты по парам (пользователь, день) для всех зарегистрированных пользователей:
+        [(user_id, day, count, systolic_sum, diastolic_sum, pulse_sum), ...];
+        пользователи без измерений — одной строкой с day = None.
+        """
+
+    # Обслуживание
+
+    def archive_old_records(self, days=ARCHIVE_AFTER_DAYS):
+        """
+        Переносит старые измерения в холодное хранилище. Возвращает число перенесённых.
+        """
+        return 0
+
+
+def check_user_fields(fields):
+    unknown = set(fields) - set(USER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля пользователя: {', '.join(sorted(unknown))}")
+
+
+def get_storage(backend=STORAGE_BACKEND):
+    """
+    Создаёт хранилище по имени: "sqlite" или "memory".
+    """
+    if backend == "sqlite":
+        from .sqlite_storage import SQLiteStorage
+        from .recent_cache import RecentReadingsCache
+        return SQLiteStorage(recent_cache=RecentReadingsCache() if RECENT_CACHE_SIZE > 0 else None)
+    if backend == "memory":
+        from .memory_storage import InMemoryStorage
+        return InMemoryStorage()
+    raise ValueError(f"Неизвестное хранилище: {backend}")
@@ -1 +1,18 @@
-﻿DB_NAME = "data.db"
+﻿import os
+
+# Путь к базе можно переопределить через окружение (например, для реплея на копии базы)
+DB_NAME = os.getenv("DB_NAME", "data.db")
+
+# Архив старых измерений (холодное хранение по годам)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "database/archive")
+ARCHIVE_AFTER_DAYS = 365  # Записи старше этого возраста переносятся в архив
+ARCHIVE_INTERVAL_HOURS = 24  # Как часто запускать перенос
+ARCHIVE_VACUUM_FREE_SHARE = 0.25  # VACUUM после переноса, только если свободные страницы — не меньше этой доли файла
+
+# Хранилище данных: "sqlite" (рабочее) или "memory" (для тестов и нагрузочных замеров)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+# Кэш последних измерений активных пользователей (только для sqlite; 0 — выключен)
+RECENT_CACHE_SIZE = int(os.getenv("RECENT_CACHE_SIZE", "10"))  # Измерений на пользователя
+RECENT_CACHE_IDLE_SECONDS = int(os.getenv("RECENT_CACHE_IDLE_SECONDS", "1800"))  # Вытеснять неактивных
+RECENT_CACHE_MAX_BYTES = int(os.getenv("RECENT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))  # Общий предел
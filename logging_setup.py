@@ -0,0 +1,119 @@
+﻿# logging_setup.py
+# Неблокирующее логирование: обработчики пишут в очередь,
+# файл и консоль обслуживает отдельный поток QueueListener.
+
+import os
+import json
+import queue
+import random
+import atexit
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FILE = os.path.join(LOG_DIR, "bot.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Доля сохраняемых записей для массовых событий (помеченных sampled=True)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+# Логгеры, чьи INFO-записи массовые целиком (aiogram пишет "Update id=... is handled" на каждое обновление)
+SAMPLED_LOGGERS = ("aiogram.event",)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Дополнительные поля, которые попадают в JSON, если переданы через extra=
+STRUCTURED_FIELDS = ("event", "user_id", "handler", "update_type", "duration_ms")
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирует запись в одну строку JSON.
+    """
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только часть записей, помеченных extra={"sampled": True} или пришедших из SAMPLED_LOGGERS.
+    Предупреждения и ошибки не отбрасываются никогда.
+    """
+
+    def __init__(self, rate=LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        if not getattr(record, "sampled", False) and record.name not in SAMPLED_LOGGERS:
+            return True
+        return random.random() < self.rate
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler, который сохраняет exc_info и extra-поля для JSON-форматтера.
+    Стандартный prepare() форматирует запись и склеивает исключение с текстом
+    сообщения прямо в потоке бота; здесь всё форматирование делает слушатель.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+
+def setup_logging():
+    """
+    Настраивает корневой логгер: запись в очередь в потоке бота,
+    ротация файла и вывод в консоль — в фоновом потоке.
+    Повторный вызов ничего не делает.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+
+    file_handler = RotatingFileHandler(
+        LOG_FILE,
+        maxBytes=5 * 1024 * 1024,  # 5 МБ
+        backupCount=3,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
@@ -0,0 +1,160 @@
+﻿# loop_watchdog.py
+# Сторож задержек event loop: замеряет лаг цикла и при зависании
+# показывает, на какой строке какого обработчика стоит поток бота.
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Настройки (можно переопределить через .env)
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))  # период замера
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "200"))  # порог зависания
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "3000"))  # замеров для перцентилей
+LOOP_LAG_REPORT_SECONDS = int(os.getenv("LOOP_LAG_REPORT_SECONDS", "300"))  # 0 — не писать в лог
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+# Служебные файлы проекта, которые не считаются местом блокировки
+SKIP_FILES = {"middlewares.py", "capture.py", "loop_watchdog.py"}
+
+logger = logging.getLogger(__name__)
+
+
+def _is_project_frame(filename):
+    return (
+        filename.startswith(PROJECT_ROOT)
+        and "site-packages" not in filename
+        and os.path.basename(filename) not in SKIP_FILES
+    )
+
+
+def _frame_label(frame):
+    filename = frame.f_code.co_filename
+    if filename.startswith(PROJECT_ROOT):
+        filename = os.path.relpath(filename, PROJECT_ROOT)
+    return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+
+
+def blocking_location(frame):
+    """
+    По кадру потока event loop определяет обработчик (внешний кадр проекта,
+    запущенный из цикла) и строку, на которой он блокирует (внутренний кадр проекта).
+    Возвращает (handler, line, stack) или None, если код проекта не найден.
+    """
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()  # от внешнего кадра к внутреннему
+
+    # Всё, что выше последнего кадра asyncio, — запуск цикла (main.py, asyncio.run)
+    start = 0
+    for i, f in enumerate(stack):
+        if os.sep + "asyncio" + os.sep in f.f_code.co_filename:
+            start = i + 1
+    project = [f for f in stack[start:] if _is_project_frame(f.f_code.co_filename)]
+    if not project:
+        return None
+
+    lines = [_frame_label(f) for f in stack[start:]]
+    return project[0].f_code.co_name, _frame_label(project[-1]), lines
+
+
+class LoopWatchdog:
+    """
+    Корутина-пульс раз в LOOP_LAG_INTERVAL_MS отмечает, что цикл жив, и записывает лаг.
+    Фоновый поток следит за пульсом; если его нет дольше LOOP_LAG_THRESHOLD_MS,
+    снимает стек потока цикла через sys._current_frames() и пишет его в лог.
+    """
+
+    def __init__(self, interval_ms=LOOP_LAG_INTERVAL_MS, threshold_ms=LOOP_LAG_THRESHOLD_MS, window=LOOP_LAG_WINDOW):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.samples = deque(maxlen=window)
+        self.stalls = 0
+        self.last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """
+        Запускает пульс в текущем event loop и поток наблюдения.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+        if LOOP_LAG_REPORT_SECONDS > 0:
+            asyncio.get_running_loop().create_task(self._report_periodically())
+
+    def stop(self):
+        self._stop.set()
+
+    async def _heartbeat(self):
+        while not self._stop.is_set():
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.samples.append(max(0.0, now - before - self.interval) * 1000)
+            self.last_beat = now
+
+    def _monitor(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval / 2):
+            beat = self.last_beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled <= self.threshold or beat == reported_beat:
+                continue
+            # Одно зависание — одна запись в лог
+            reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            location = blocking_location(frame) if frame is not None else None
+            if location is None:
+                logger.warning(
+                    "Event loop заблокирован %.0f мс вне кода проекта", stalled * 1000,
+                    extra={"event": "loop_lag", "duration_ms": round(stalled * 1000, 2)}
+                )
+                continue
+            handler, line, stack = location
+            logger.warning(
+                "Event loop заблокирован %.0f мс: %s, строка %s\n%s",
+                stalled * 1000, handler, line, "\n".join(stack),
+                extra={"event": "loop_lag", "handler": handler, "duration_ms": round(stalled * 1000, 2)}
+            )
+
+    def percentiles(self):
+        """
+        Перцентили лага цикла (мс) по последним замерам.
+        """
+        values = sorted(self.samples)
+        if not values:
+            return {"count": 0}
+
+        def pick(q):
+            return round(values[min(len(values) - 1, int(q / 100 * len(values)))], 2)
+
+        return {
+            "count": len(values),
+            "p50": pick(50),
+            "p95": pick(95),
+            "p99": pick(99),
+            "max": round(values[-1], 2),
+            "stalls": self.stalls,
+        }
+
+    async def _report_periodically(self):
+        while not self._stop.is_set():
+            await asyncio.sleep(LOOP_LAG_REPORT_SECONDS)
+            stats = self.percentiles()
+            logger.info(
+                "Лаг event loop, мс: p50 %s, p95 %s, p99 %s, max %s, зависаний %s",
+                stats.get("p50"), stats.get("p95"), stats.get("p99"), stats.get("max"), stats.get("stalls"),
+                extra={"event": "loop_lag_stats"}
+            )
+
+
+watchdog = LoopWatchdog()
@@ -1,29 +1,46 @@
 ﻿
 import sqlite3
 import pandas as pd
-import matplotlib.pyplot as plt
 import asyncio
 import logging
 import os
 import sys
+import csv
+import functools
+import zipfile
+import zlib
+import time
 
 from datetime import datetime
-from logging.handlers import RotatingFileHandler
+from pathlib import Path
 from aiogram.exceptions import TelegramConflictError
 from io import BytesIO
-from aiogram.types import BufferedInputFile
+from aiogram.types import BufferedInputFile, FSInputFile
 from importlib.metadata import version as package_version, PackageNotFoundError
 from aiogram import Bot, Dispatcher, F
-from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, Chat, User
-from aiogram.filters import Command, CommandStart
+from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove, Chat, User, CallbackQuery
+from aiogram.filters import Command, CommandStart, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.utils.keyboard import ReplyKeyboardBuilder
+from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 from check.check_exists_db import check_and_create_tables
+from database import apply_migrations, assess_reading, get_storage, MEASUREMENT_HEADERS
+from analytics import get_admin_report
+from charts import render_pressure_chart
+from reports import get_weekly_report, build_weekly_reports, seconds_until_next_build, start_report_pool
+from quick_entry import parse_reading, check_value, check_pressure, check_comment, ReadingValidationError
+from loop_watchdog import watchdog
+from logging_setup import setup_logging
+from middlewares import LoggingMiddleware
+from capture import CaptureMiddleware, CAPTURE_UPDATES
+from memdebug import (
+    MEM_TRACEMALLOC, start_tracing, fsm_storage_stats, collect_memory_report,
+    format_memory_report, sample_memory_periodically
+)
 
 # Конфигурация
 from config import BOT_TOKEN, INTERFACE_VERSION, ADMIN_IDS
-from db_config import DB_NAME
+from db_config import DB_NAME, ARCHIVE_DIR, ARCHIVE_INTERVAL_HOURS, STORAGE_BACKEND
 
 # Вывод версий пакетов
 def print_versions():
@@ -46,18 +63,49 @@ def print_versions():
 
 print_versions()
 
+# Пул процессов для недельных отчётов — до запуска любых потоков (логирования, сторожа, записи обновлений),
+# чтобы fork не унаследовал их захваченные блокировки
+report_pool = start_report_pool()
+
+# Логирование через очередь: запись на диск и в консоль — в фоновом потоке
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# Трассировка памяти с самого запуска (MEM_TRACEMALLOC=1), иначе включается по /debug_mem
+if MEM_TRACEMALLOC:
+    start_tracing()
+
 # Убедимся, что таблицы существуют при запуске
-check_and_create_tables()
+if STORAGE_BACKEND == "sqlite":
+    check_and_create_tables()
+    apply_migrations()
+
+# Хранилище пользователей и измерений (STORAGE_BACKEND=sqlite|memory)
+storage = get_storage()
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
+dp.message.middleware(LoggingMiddleware())
+dp.callback_query.middleware(LoggingMiddleware())
+
+# Тексты кнопок не содержат персональных данных и нужны для воспроизведения как есть
+MENU_BUTTON_TEXTS = (
+    "💚 Добавить запись", "📋 Последние записи", "📈 График давления",
+    "📤 Экспорт в Excel", "📄 Отчёт", "🔒 Выход", "🟢 Начать", "Что обновили?",
+    "Не заполнять комментарий",
+)
 
-BACKUP_DIR = "backups"
+# Запись входящих обновлений для реплея (включается CAPTURE_UPDATES=1)
+if CAPTURE_UPDATES:
+    dp.update.outer_middleware(CaptureMiddleware(keep_texts=MENU_BUTTON_TEXTS))
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
 os.makedirs(BACKUP_DIR, exist_ok=True)
 
 # Функция для ограничения доступа только админам
 def admin_only(handler):
+    @functools.wraps(handler)
     async def wrapper(message: Message):
         if message.from_user.id not in ADMIN_IDS:
             await message.answer("❌ У вас нет доступа к этой команде.")
@@ -67,47 +115,46 @@ def admin_only(handler):
 
 # Функция для получения последнего бэкапа
 def get_last_backup_path():
-    backups = sorted(Path(BACKUP_DIR).glob("db_*.db"), reverse=True)
+    backups = sorted(Path(BACKUP_DIR).glob("db_*.zip"), reverse=True)
     return backups[0] if backups else None
 
 # Функция для создания бэкапа
 def create_backup_if_needed():
     last_backup = get_last_backup_path()
-    now = datetime.datetime.now()
+    now = datetime.now()
     
     if last_backup:
-        delta = now - datetime.datetime.strptime(last_backup.stem.split('_')[1], "%Y-%m-%d-%H-%M")
+        delta = now - datetime.strptime(last_backup.stem.split('_')[1], "%Y-%m-%d-%H-%M")
         if delta.days < 7:
             return last_backup  # Бэкап свежий
-    # Иначе создаём новый
+    # Иначе создаём новый: основная база и годовые архивы в одном zip
     date_str = now.strftime("%Y-%m-%d-%H-%M")
-    backup_path = Path(BACKUP_DIR) / f"db_{date_str}.db"
-    with open(DB_NAME, "rb") as src, open(backup_path, "wb") as dst:
-        dst.write(src.read())
+    backup_path = Path(BACKUP_DIR) / f"db_{date_str}.zip"
+    with zipfile.ZipFile(backup_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.write(DB_NAME, arcname=os.path.basename(DB_NAME))
+        for path in sorted(Path(ARCHIVE_DIR).glob("data_*.db")):
+            archive.write(path, arcname=f"archive/{path.name}")
     return backup_path
 
 # Отправка последнего или нового бэкапа
 @dp.message(Command("backup"))
 @admin_only
-async def cmd_backup(message: types.Message):
-    path = create_backup_if_needed()
+async def cmd_backup(message: Message):
+    path = await asyncio.to_thread(create_backup_if_needed)
     if path:
-        await message.answer_document(FSInputFile(path), caption="📦 Актуальный бэкап базы")
+        await message.answer_document(FSInputFile(path), caption="📦 Актуальный бэкап базы (с годовыми архивами)")
     else:
         await message.answer("❌ Бэкап не найден и не удалось создать.")
 
 # Экспорт таблицы в CSV
 @dp.message(Command("export_csv"))
 @admin_only
-async def cmd_export_csv(message: types.Message):
+async def cmd_export_csv(message: Message):
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM ad_pressure_measurements")
-        rows = cursor.fetchall()
-        headers = [desc[0] for desc in cursor.description]
+        rows = storage.all_measurements()
+        headers = MEASUREMENT_HEADERS
 
-        csv_path = "backups/export.csv"
+        csv_path = os.path.join(BACKUP_DIR, "export.csv")
         with open(csv_path, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
             writer.writerow(headers)
@@ -116,27 +163,18 @@ async def cmd_export_csv(message: types.Message):
         await message.answer_document(FSInputFile(csv_path), caption="🗂 Экспорт в CSV завершён")
     except Exception as e:
         await message.answer(f"❌ Ошибка при экспорте: {e}")
-    finally:
-        conn.close()
 
 # Последние записи пользователя
 
 @dp.message(Command("send_last_records"))
 @admin_only
-async def cmd_send_last_records(message: types.Message):
+async def cmd_send_last_records(message: Message):
     try:
         user_id = message.from_user.id
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT systolic, diastolic, pulse, timestamp 
-            FROM ad_pressure_measurements 
-            WHERE user_id = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 5
-        """, (user_id,))
-        records = cursor.fetchall()
+        records = [
+            (systolic, diastolic, pulse, timestamp)
+            for systolic, diastolic, pulse, _, timestamp in storage.recent_measurements(user_id, 5)
+        ]
 
         if not records:
             await message.answer("Нет записей давления для вас.")
@@ -149,9 +187,121 @@ async def cmd_send_last_records(message: types.Message):
         await message.answer(text)
     except Exception as e:
         await message.answer(f"❌ Ошибка при получении данных: {e}")
-    finally:
-        conn.close()
 
+# Сводный отчёт по всем пользователям
+@dp.message(Command("admin_report"))
+@admin_only
+async def cmd_admin_report(message: Message):
+    try:
+        await message.answer(await get_admin_report(storage))
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при построении отчёта: {e}")
+
+# Диагностика памяти процесса
+@dp.message(Command("debug_mem"))
+@admin_only
+async def cmd_debug_mem(message: Message):
+    try:
+        report = await asyncio.to_thread(collect_memory_report, fsm_storage_stats(dp.storage))
+        text = format_memory_report(report)
+        cache = getattr(storage, "recent_cache", None)
+        if cache is not None:
+            stats = cache.stats()
+            text += (
+                f"\n🗃 Кэш последних записей: пользователей {stats['users']}, ~{stats['bytes'] / 1024:.1f} КБ, "
+                f"попаданий {stats['hits']}, промахов {stats['misses']}"
+            )
+        await message.answer(text)
+    except Exception as e:
+        await message.answer(f"❌ Ошибка при сборе статистики памяти: {e}")
+
+# Задержки event loop
+@dp.message(Command("debug_loop"))
+@admin_only
+async def cmd_debug_loop(message: Message):
+    stats = watchdog.percentiles()
+    if not stats["count"]:
+        await message.answer("Замеров пока нет.")
+        return
+    await message.answer(
+        "⏱ Лаг event loop (последние замеры), мс:\n\n"
+        f"p50: {stats['p50']}\n"
+        f"p95: {stats['p95']}\n"
+        f"p99: {stats['p99']}\n"
+        f"max: {stats['max']}\n"
+        f"Зависаний с запуска: {stats['stalls']} (подробности в логах)"
+    )
+
+# Поиск по комментариям
+# Страница из 10 записей должна уложиться в лимит Telegram в 4096 символов
+SEARCH_COMMENT_MAX_CHARS = 300
+SEARCH_QUERY_MAX_CHARS = 100
+SEARCH_QUERIES_KEPT = 10  # Сколько последних запросов помнят кнопки "Ещё"
+
+def shorten(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+def search_query_key(query):
+    # Короткий ключ запроса для callback_data (до 64 байт)
+    return f"{zlib.crc32(query.encode()):08x}"
+
+async def send_search_page(message: Message, user_id: int, query: str, before_id=None):
+    records, next_before_id = await asyncio.to_thread(storage.search_comments, user_id, query, before_id)
+
+    if not records:
+        await message.answer("🔍 Ничего не найдено." if before_id is None else "🔍 Больше записей нет.")
+        return
+
+    response = f"🔍 Записи с комментарием «{shorten(query, SEARCH_QUERY_MAX_CHARS)}»:\n\n"
+    for _, systolic, diastolic, pulse, comment, timestamp in records:
+        comment = shorten(comment, SEARCH_COMMENT_MAX_CHARS)
+        response += (
+            f"🕒 {timestamp}\n"
+            f"{systolic} / {diastolic}\n"
+            f"Пульс: {pulse}\n"
+            f"Комментарий: {comment}\n\n"
+        )
+
+    reply_markup = None
+    if next_before_id is not None:
+        builder = InlineKeyboardBuilder()
+        # Курсор привязан к своему запросу: кнопка под старой выдачей листает именно её
+        builder.button(text="Ещё ▶", callback_data=f"search:{search_query_key(query)}:{next_before_id}")
+        reply_markup = builder.as_markup()
+
+    await message.answer(response, reply_markup=reply_markup)
+
+@dp.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    # Проверяем версию интерфейса
+    if await check_and_update_interface(message):
+        return  # Если версия обновлена, прекращаем выполнение
+
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Использование: /search <текст>\nНапример: /search голова")
+        return
+
+    # Запоминаем запрос для кнопки "Ещё" (несколько последних — кнопки остаются под каждой выдачей)
+    key = search_query_key(query)
+    queries = (await state.get_data()).get("search_queries", {})
+    queries = {k: q for k, q in queries.items() if k != key}
+    queries[key] = query
+    await state.update_data(search_queries=dict(list(queries.items())[-SEARCH_QUERIES_KEPT:]))
+    await send_search_page(message, message.from_user.id, query)
+
+@dp.callback_query(F.data.startswith("search:"))
+async def cb_search_more(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    await callback.answer()
+    parts = callback.data.split(":")
+    query = data.get("search_queries", {}).get(parts[1]) if len(parts) == 3 else None
+    if not query:
+        await callback.message.answer("Повторите поиск командой /search <текст>")
+        return
+
+    before_id = int(parts[2])
+    await send_search_page(callback.message, callback.from_user.id, query, before_id)
 
 # Класс для хранения состояния FSM
 class PressureStates(StatesGroup):
@@ -165,22 +315,15 @@ async def check_and_update_interface(message: Message):
     Проверяет версию интерфейса пользователя и обновляет её при необходимости.
     """
     user_id = message.from_user.id
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
 
     # Получаем текущую версию интерфейса пользователя
-    cursor.execute("SELECT interface_version FROM ad_users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
-    current_version = user[0] if user else None
+    user = storage.get_user(user_id)
+    current_version = user[2] if user else None
     latest_version = INTERFACE_VERSION
 
     if current_version != latest_version:
         # Обновляем версию интерфейса
-        cursor.execute(
-            "UPDATE ad_users SET interface_version = ? WHERE user_id = ?",
-            (latest_version, user_id)
-        )
-        conn.commit()
+        storage.update_user(user_id, interface_version=latest_version)
 
         # Отправляем уведомление об обновлении
         await message.answer(
@@ -191,9 +334,7 @@ async def check_and_update_interface(message: Message):
         # Показываем новое меню с кнопками "Начать" и "Что нового"
         await show_update_menu(message)
 
-        conn.close()
         return True  # Версия была обновлена
-    conn.close()
     return False  # Версия актуальна
 
 # Старт / регистрация
@@ -211,11 +352,7 @@ async def cmd_start(message: Message, state: FSMContext):
     )
     await asyncio.sleep(0.5)  # Небольшая задержка для лучшего UX
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT interface_version FROM ad_users WHERE user_id = ?", (user_id,))
-    user = cursor.fetchone()
+    user = storage.get_user(user_id)
 
     if not user:
         builder = ReplyKeyboardBuilder()
@@ -226,16 +363,12 @@ async def cmd_start(message: Message, state: FSMContext):
         )
     else:
         # Проверяем версию интерфейса
-        current_version = user[0] if user else None
+        current_version = user[2] if user else None
         latest_version = INTERFACE_VERSION
 
         if current_version != latest_version:
             # Обновляем версию интерфейса
-            cursor.execute(
-                "UPDATE ad_users SET interface_version = ? WHERE user_id = ?",
-                (latest_version, user_id)
-            )
-            conn.commit()
+            storage.update_user(user_id, interface_version=latest_version)
 
             # Отправляем уведомление об обновлении
             await message.answer(
@@ -253,30 +386,19 @@ async def cmd_start(message: Message, state: FSMContext):
         # Показываем главное меню
         await show_main_menu(message)
 
-    conn.close()
-
 # Приём контакта
 @dp.message(F.contact)
 async def handle_contact(message: Message):
     user_id = message.from_user.id
     phone = message.contact.phone_number
 
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "INSERT OR IGNORE INTO ad_users (user_id, phone) VALUES (?, ?)",
-        (user_id, phone)
-    )
-    conn.commit()
-    conn.close()
+    storage.register_user(user_id, phone)
 
     await message.answer("✅ Регистрация прошла успешно!")
     await show_main_menu(message)
 
-# Главное меню
-async def show_main_menu(message: Message):
-    # Создаем новую клавиатуру
+# Клавиатура главного меню
+def main_menu_markup():
     builder = ReplyKeyboardBuilder()
     builder.row(KeyboardButton(text="💚 Добавить запись"))
     builder.row(
@@ -285,10 +407,29 @@ async def show_main_menu(message: Message):
     )
     builder.row(
         KeyboardButton(text="📤 Экспорт в Excel"),
-        KeyboardButton(text="🔒 Выход")
+        KeyboardButton(text="📄 Отчёт")
     )
+    builder.row(KeyboardButton(text="🔒 Выход"))
+    return builder.as_markup(resize_keyboard=True)
 
-    await message.answer("📊 Выберите действие:", reply_markup=builder.as_markup(resize_keyboard=True))
+# Главное меню
+async def show_main_menu(message: Message):
+    await message.answer("📊 Выберите действие:", reply_markup=main_menu_markup())
+
+def save_measurement(user_id, systolic, diastolic, pulse, comment):
+    """
+    Сохраняет запись давления и обновляет личную норму пользователя.
+    Возвращает список предупреждений по этой записи.
+    """
+    # Сравниваем с нормой до учёта этой записи
+    baseline = storage.add_measurement(user_id, systolic, diastolic, pulse, comment)
+    return assess_reading(baseline, systolic, diastolic, pulse)
+
+async def send_reading_alerts(message: Message, alerts):
+    if alerts:
+        await message.answer("\n".join(alerts))
+
+QUICK_ENTRY_HINT = "💡 Можно ввести запись одним сообщением: 135/85 72 комментарий"
 
 # Добавление записи
 @dp.message(F.text == "💚 Добавить запись")
@@ -298,7 +439,51 @@ async def cmd_add_record(message: Message, state: FSMContext):
         return  # Если версия обновлена, прекращаем выполнение
     
     await state.set_state(PressureStates.waiting_for_systolic)
-    await message.answer("Введите верхнее давление (систолическое):")
+    await message.answer(f"Введите верхнее давление (систолическое):\n\n{QUICK_ENTRY_HINT}")
+
+# Быстрый ввод: вся запись одним сообщением из главного меню ("135/85 72 после прогулки")
+@dp.message(StateFilter(None), F.text.regexp(r"^\s*\d"))
+async def cmd_quick_entry(message: Message, state: FSMContext):
+    # Проверяем версию интерфейса
+    if await check_and_update_interface(message):
+        return  # Если версия обновлена, прекращаем выполнение
+
+    problem = "Не удалось распознать запись."
+    try:
+        reading = parse_reading(message.text)
+    except ReadingValidationError as e:
+        reading = None
+        problem = f"❌ {e}"
+
+    if reading is None:
+        # Не удалось разобрать — переходим к пошаговому вводу
+        if message.text.strip().isdigit():
+            # Одно число — считаем его верхним давлением и продолжаем со следующего шага
+            systolic = int(message.text)
+            try:
+                check_value("systolic", systolic)
+            except ReadingValidationError as e:
+                problem = f"❌ {e}"
+            else:
+                await state.update_data(systolic=systolic)
+                await state.set_state(PressureStates.waiting_for_diastolic)
+                await message.answer("Введите нижнее давление (диастолическое):")
+                return
+        await state.set_state(PressureStates.waiting_for_systolic)
+        await message.answer(
+            f"{problem} Введём по шагам.\n"
+            "Введите верхнее давление (систолическое):"
+        )
+        return
+
+    systolic, diastolic, pulse, comment = reading
+    alerts = await asyncio.to_thread(save_measurement, message.from_user.id, systolic, diastolic, pulse, comment)
+    await message.answer(
+        f"✅ Запись сохранена: {systolic} / {diastolic}, пульс {pulse}"
+        + (f"\nКомментарий: {comment}" if comment else ""),
+        reply_markup=main_menu_markup()
+    )
+    await send_reading_alerts(message, alerts)
 
 @dp.message(PressureStates.waiting_for_systolic)
 async def process_systolic(message: Message, state: FSMContext):
@@ -308,11 +493,17 @@ async def process_systolic(message: Message, state: FSMContext):
     
     try:
         systolic = int(message.text)
-        await state.update_data(systolic=systolic)
-        await state.set_state(PressureStates.waiting_for_diastolic)
-        await message.answer("Введите нижнее давление (диастолическое):")
+        check_value("systolic", systolic)
+    except ReadingValidationError as e:
+        await message.answer(f"❌ {e} Введите верхнее давление ещё раз:")
+        return
     except ValueError:
         await message.answer("❌ Введите число!")
+        return
+
+    await state.update_data(systolic=systolic)
+    await state.set_state(PressureStates.waiting_for_diastolic)
+    await message.answer("Введите нижнее давление (диастолическое):")
 
 @dp.message(PressureStates.waiting_for_diastolic)
 async def process_diastolic(message: Message, state: FSMContext):
@@ -322,11 +513,18 @@ async def process_diastolic(message: Message, state: FSMContext):
     
     try:
         diastolic = int(message.text)
-        await state.update_data(diastolic=diastolic)
-        await state.set_state(PressureStates.waiting_for_pulse)
-        await message.answer("Введите пульс:")
+        check_value("diastolic", diastolic)
+        check_pressure((await state.get_data())["systolic"], diastolic)
+    except ReadingValidationError as e:
+        await message.answer(f"❌ {e} Введите нижнее давление ещё раз:")
+        return
     except ValueError:
         await message.answer("❌ Введите число!")
+        return
+
+    await state.update_data(diastolic=diastolic)
+    await state.set_state(PressureStates.waiting_for_pulse)
+    await message.answer("Введите пульс:")
 
 # Переход к шагу ввода комментария
 @dp.message(PressureStates.waiting_for_pulse)
@@ -337,20 +535,26 @@ async def process_pulse(message: Message, state: FSMContext):
     
     try:
         pulse = int(message.text)
-        await state.update_data(pulse=pulse)
-
-        # Создаем клавиатуру с кнопкой "Не заполнять комментарий"
-        builder = ReplyKeyboardBuilder()
-        builder.add(KeyboardButton(text="Не заполнять комментарий"))
-        builder.adjust(1)  # Кнопка будет одна в строке
-
-        await state.set_state(PressureStates.waiting_for_comment)
-        await message.answer(
-            "Добавьте комментарий (или нажмите кнопку ниже):",
-            reply_markup=builder.as_markup(resize_keyboard=True)
-        )
+        check_value("pulse", pulse)
+    except ReadingValidationError as e:
+        await message.answer(f"❌ {e} Введите пульс ещё раз:")
+        return
     except ValueError:
         await message.answer("❌ Введите число!")
+        return
+
+    await state.update_data(pulse=pulse)
+
+    # Создаем клавиатуру с кнопкой "Не заполнять комментарий"
+    builder = ReplyKeyboardBuilder()
+    builder.add(KeyboardButton(text="Не заполнять комментарий"))
+    builder.adjust(1)  # Кнопка будет одна в строке
+
+    await state.set_state(PressureStates.waiting_for_comment)
+    await message.answer(
+        "Добавьте комментарий (или нажмите кнопку ниже):",
+        reply_markup=builder.as_markup(resize_keyboard=True)
+    )
 
 @dp.message(PressureStates.waiting_for_comment)
 async def process_comment(message: Message, state: FSMContext):
@@ -369,19 +573,17 @@ async def process_comment(message: Message, state: FSMContext):
     else:
         comment = message.text
 
+    try:
+        check_comment(comment)
+    except ReadingValidationError as e:
+        await message.answer(f"❌ {e} Введите комментарий покороче:", reply_markup=builder.as_markup(resize_keyboard=True))
+        return
+
     # Получаем данные из FSM
     data = await state.get_data()
 
     # Сохраняем данные в базу данных
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "INSERT INTO ad_pressure_measurements (user_id, systolic, diastolic, pulse, comment1) VALUES (?, ?, ?, ?, ?)",
-        (message.from_user.id, data['systolic'], data['diastolic'], data['pulse'], comment)
-    )
-    conn.commit()
-    conn.close()
+    alerts = save_measurement(message.from_user.id, data['systolic'], data['diastolic'], data['pulse'], comment)
 
     # Очищаем состояние и показываем главное меню
     await state.clear()
@@ -389,6 +591,7 @@ async def process_comment(message: Message, state: FSMContext):
         "✅ Запись успешно сохранена!",
         reply_markup=ReplyKeyboardRemove()  # Убираем клавиатуру
     )
+    await send_reading_alerts(message, alerts)
     await show_main_menu(message)
 
 # Последние записи
@@ -398,15 +601,7 @@ async def cmd_list_records(message: Message):
     if await check_and_update_interface(message):
         return  # Если версия обновлена, прекращаем выполнение
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT systolic, diastolic, pulse, comment1, timestamp FROM ad_pressure_measurements WHERE user_id = ? ORDER BY timestamp DESC LIMIT 10",
-        (message.from_user.id,)
-    )
-    records = cursor.fetchall()
-    conn.close()
+    records = storage.recent_measurements(message.from_user.id, 10)
 
     if not records:
         await message.answer("📭 У вас пока нет записей.")
@@ -430,15 +625,8 @@ async def cmd_graph(message: Message):
     if await check_and_update_interface(message):
         return  # Если версия обновлена, прекращаем выполнение
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT timestamp, systolic, diastolic, pulse FROM ad_pressure_measurements WHERE user_id = ? ORDER BY timestamp",
-        (message.from_user.id,)
-    )
-    records = cursor.fetchall()
-    conn.close()
+    # График строится за всё время, включая архив
+    records = storage.measurements_range(message.from_user.id)
 
     if not records:
         await message.answer("📭 У вас пока нет записей.")
@@ -446,30 +634,14 @@ async def cmd_graph(message: Message):
 
     # Форматируем даты для графика
     dates = [datetime.strptime(record[0], "%Y-%m-%d %H:%M:%S") for record in records]
-    formatted_dates = [dt.strftime("%d.%m.%Y %H:%M") for dt in dates]
-    
     systolic = [record[1] for record in records]
     diastolic = [record[2] for record in records]
     pulse = [record[3] for record in records]
 
-    plt.figure(figsize=(12, 7))
-    plt.plot(formatted_dates, systolic, label="Верхнее (сист.)", marker="o")
-    plt.plot(formatted_dates, diastolic, label="Нижнее (диаст.)", marker="o")
-    plt.plot(formatted_dates, pulse, label="Пульс", linestyle="--", marker="x")
-    plt.xlabel("Дата и время", fontsize=12)
-    plt.ylabel("Значение", fontsize=12)
-    plt.title("Динамика давления и пульса", fontsize=14)
-    plt.legend(fontsize=10)
-    plt.grid(True)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format="png", dpi=300, bbox_inches="tight")
-    img_buffer.seek(0)
-    plt.close()
-
-    photo = BufferedInputFile(img_buffer.getvalue(), filename="pressure_graph.png")
+    # Рендер на готовом шаблоне фигуры в отдельном потоке
+    image, filename = await asyncio.to_thread(render_pressure_chart, dates, systolic, diastolic, pulse)
+
+    photo = BufferedInputFile(image, filename=filename)
     await message.answer_photo(photo, caption="📈 Ваша динамика давления и пульса")
 
 @dp.message(F.text == "📤 Экспорт в Excel")
@@ -478,15 +650,8 @@ async def cmd_export_excel(message: Message):
     if await check_and_update_interface(message):
         return  # Если версия обновлена, прекращаем выполнение
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
-    cursor.execute(
-        "SELECT timestamp, systolic, diastolic, pulse, comment1 FROM ad_pressure_measurements WHERE user_id = ?",
-        (message.from_user.id,)
-    )
-    records = cursor.fetchall()
-    conn.close()
+    # Экспорт включает всю историю, включая архив
+    records = storage.measurements_range(message.from_user.id)
 
     if not records:
         await message.answer("📭 У вас пока нет записей.")
@@ -527,6 +692,26 @@ async def cmd_export_excel(message: Message):
     document = BufferedInputFile(bio.getvalue(), filename=filename)
     await message.answer_document(document, caption=f"📊 Ваши данные в Excel ({current_time.replace('_', '.')})")
 
+# Недельный отчёт в PDF: обычно уже готов (см. build_reports_periodically)
+@dp.message(F.text == "📄 Отчёт")
+async def cmd_weekly_report(message: Message):
+    # Проверяем версию интерфейса
+    if await check_and_update_interface(message):
+        return  # Если версия обновлена, прекращаем выполнение
+
+    report = await asyncio.to_thread(get_weekly_report, storage, message.from_user.id)
+    if report is None:
+        await message.answer("📭 За последнюю неделю записей нет.")
+        return
+
+    path, meta = report
+    period_end = datetime.strptime(meta["period_end"], "%Y-%m-%d %H:%M:%S")
+    period_start = datetime.strptime(meta["period_start"], "%Y-%m-%d %H:%M:%S")
+    await message.answer_document(
+        FSInputFile(path, filename=f"pressure_report_{period_end:%d_%m_%Y}.pdf"),
+        caption=f"📄 Отчёт за {period_start:%d.%m.%Y} — {period_end:%d.%m.%Y}"
+    )
+
 @dp.message(F.text == "🟢 Начать")
 async def cmd_start_after_update(message: Message, state: FSMContext):
     """
@@ -568,36 +753,21 @@ async def update_all_users_interface_version():
     Обновляет версию интерфейса для всех пользователей в базе данных.
     """
     latest_version = INTERFACE_VERSION
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
 
     try:
         # Обновляем версию интерфейса для всех пользователей
-        cursor.execute(
-            "UPDATE ad_users SET interface_version = ?",
-            (latest_version,)
-        )
-        conn.commit()
+        storage.update_all_users(interface_version=latest_version)
         print(f"Версия интерфейса успешно обновлена до {latest_version} для всех пользователей.")
     except Exception as e:
         print(f"Ошибка при обновлении версии интерфейса: {e}")
-    finally:
-        conn.close()
 
 async def notify_all_users_about_update():
     """
     Отправляет уведомление всем пользователям о новой версии интерфейса.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-
     try:
         # Получаем список всех пользователей
-        cursor.execute("SELECT user_id FROM ad_users")
-        users = cursor.fetchall()
-
-        for user in users:
-            user_id = user[0]
+        for user_id in storage.list_user_ids():
             try:
                 await bot.send_message(
                     chat_id=user_id,
@@ -614,8 +784,6 @@ async def notify_all_users_about_update():
         print("Уведомления об обновлении успешно отправлены всем пользователям.")
     except Exception as e:
         print(f"Ошибка при отправке уведомлений: {e}")
-    finally:
-        conn.close()        
 
 @dp.message(Command("update_interface"))
 async def cmd_update(message: Message):
@@ -647,42 +815,46 @@ async def cmd_backup(message: Message):
 async def cmd_logout(message: Message):
     await message.answer("🔒 Вы вышли из аккаунта.")
 
-# Включаем логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-
-# Настройка логирования
-if not os.path.exists("logs"):
-    os.makedirs("logs")
-
-# Создаем логгер
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-
-# Обработчик для вывода логов в консоль
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-
-# Обработчик для записи логов в файл
-file_handler = RotatingFileHandler(
-    "logs/bot.log",
-    maxBytes=5 * 1024 * 1024,  # 5 МБ
-    backupCount=3,
-    encoding="utf-8"
-)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
-
-# Добавляем обработчики к логгеру
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+async def archive_periodically():
+    """
+    Периодически переносит старые измерения в годовые архивы.
+    Работа с файлами выполняется в отдельном потоке, чтобы не блокировать бота.
+    """
+    while True:
+        try:
+            moved = await asyncio.to_thread(storage.archive_old_records)
+            if moved:
+                logger.info(f"В архив перенесено записей: {moved}")
+        except Exception as e:
+            logger.exception(f"❌ Ошибка при архивации: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+async def build_reports_periodically():
+    """
+    Раз в неделю в нерабочие часы готовит PDF-отчёты для всех активных пользователей,
+    чтобы утром по кнопке "📄 Отчёт" отдавать готовый файл.
+    """
+    while True:
+        await asyncio.sleep(seconds_until_next_build())
+        try:
+            started = time.perf_counter()
+            built, failed, removed = await asyncio.to_thread(build_weekly_reports, storage, report_pool)
+            logger.info(
+                f"Недельные отчёты: построено {built}, ошибок {len(failed)}, удалено устаревших {removed}, "
+                f"за {time.perf_counter() - started:.1f} с"
+            )
+            for user_id, error in failed:
+                logger.error(f"❌ Отчёт для пользователя {user_id} не построен: {error}")
+        except Exception as e:
+            logger.exception(f"❌ Ошибка при подготовке отчётов: {e}")
 
 async def main():
     try:
         logger.info("Бот запускается...")
+        watchdog.start()
+        asyncio.create_task(archive_periodically())
+        asyncio.create_task(build_reports_periodically())
+        asyncio.create_task(sample_memory_periodically(dp.storage))
         await dp.start_polling(bot)
     except TelegramConflictError:
         logger.error("❌ Конфликт с другим экземпляром бота! Завершите другие процессы.")
@@ -0,0 +1,210 @@
+﻿# memdebug.py
+# Диагностика памяти долго работающего процесса: /debug_mem и периодический сэмплер
+
+import os
+import gc
+import sys
+import time
+import asyncio
+import logging
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from matplotlib.figure import Figure
+
+# Настройки (можно переопределить через .env)
+MEM_TRACEMALLOC = os.getenv("MEM_TRACEMALLOC", "0") == "1"  # трассировка с запуска процесса
+MEM_TRACE_FRAMES = int(os.getenv("MEM_TRACE_FRAMES", "1"))
+MEM_SAMPLE_INTERVAL_MINUTES = int(os.getenv("MEM_SAMPLE_INTERVAL_MINUTES", "0"))  # 0 — выключено
+MEM_SNAPSHOT_DIR = os.getenv("MEM_SNAPSHOT_DIR", os.path.join("logs", "memory"))
+MEM_SNAPSHOT_KEEP = int(os.getenv("MEM_SNAPSHOT_KEEP", "20"))
+MEM_TOP_N = 10
+
+logger = logging.getLogger(__name__)
+
+_last_snapshot = None
+
+
+def start_tracing():
+    """
+    Включает tracemalloc, если он ещё не запущен. Возвращает True, если трассировка уже шла.
+    """
+    if tracemalloc.is_tracing():
+        return True
+    tracemalloc.start(MEM_TRACE_FRAMES)
+    return False
+
+
+def current_rss_mb():
+    """
+    Текущий RSS процесса в МБ (Linux), иначе None.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _deep_size(obj, seen=None):
+    """
+    Приблизительный размер объекта вместе с вложенными dict/list/tuple/set.
+    """
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    return size
+
+
+def fsm_storage_stats(storage):
+    """
+    Количество ключей и примерный объём данных в MemoryStorage.
+    Для других хранилищ возвращает None.
+    """
+    records = getattr(storage, "storage", None)
+    if not isinstance(records, dict):
+        return None
+    records = list(records.values())
+    return {
+        "keys": len(records),
+        "with_state": sum(1 for r in records if r.state is not None),
+        "bytes": sum(_deep_size(r.data) for r in records),
+    }
+
+
+def live_figures():
+    """
+    Число живых фигур matplotlib: открытых через pyplot и всех объектов Figure в куче.
+    """
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    pyplot_open = len(pyplot.get_fignums()) if pyplot else 0
+    in_heap = sum(1 for obj in gc.get_objects() if isinstance(obj, Figure))
+    return pyplot_open, in_heap
+
+
+def _save_snapshot(snapshot):
+    directory = Path(MEM_SNAPSHOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"snapshot_{datetime.now():%Y-%m-%d_%H-%M-%S}.tracemalloc"
+    snapshot.dump(str(path))
+
+    # Храним только последние MEM_SNAPSHOT_KEEP снимков
+    for old in sorted(directory.glob("snapshot_*.tracemalloc"))[:-MEM_SNAPSHOT_KEEP]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def collect_memory_report(fsm_stats=None):
+    """
+    Снимает снимок памяти и собирает отчёт. Выполнять в отдельном потоке;
+    fsm_stats (fsm_storage_stats) считаются заранее в потоке бота, где меняется хранилище.
+    Снимок сохраняется в MEM_SNAPSHOT_DIR для сравнения офлайн:
+    tracemalloc.Snapshot.load(a).compare_to(tracemalloc.Snapshot.load(b), "lineno").
+    """
+    global _last_snapshot
+
+    was_tracing = start_tracing()
+    report = {
+        "rss_mb": current_rss_mb(),
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "gc_uncollectable": sum(s.get("uncollectable", 0) for s in gc.get_stats()),
+        "fsm": fsm_stats,
+        "figures": live_figures(),
+        "tracing_since_start": was_tracing,
+        "top": [],
+        "growth": [],
+        "snapshot_path": None,
+    }
+
+    if not was_tracing:
+        # Трассировка только что включена — распределения появятся к следующему вызову
+        return report
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    report["traced_mb"] = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    report["top"] = [
+        (str(stat.traceback[0]), stat.size, stat.count)
+        for stat in snapshot.statistics("lineno")[:MEM_TOP_N]
+    ]
+    if _last_snapshot is not None:
+        report["growth"] = [
+            (str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+            for stat in snapshot.compare_to(_last_snapshot, "lineno")[:MEM_TOP_N]
+            if stat.size_diff
+        ]
+    _last_snapshot = snapshot
+    report["snapshot_path"] = str(_save_snapshot(snapshot))
+    return report
+
+
+def _short_site(site):
+    # Обрезаем длинные пути до имени файла и строки
+    return os.path.basename(site)
+
+
+def format_memory_report(report):
+    """
+    Текстовое представление отчёта для Telegram.
+    """
+    rss = f"{report['rss_mb']:.1f} МБ" if report["rss_mb"] is not None else "н/д"
+    pyplot_open, in_heap = report["figures"]
+    text = (
+        "🧠 Память процесса\n\n"
+        f"RSS: {rss}\n"
+        f"Объектов под GC: {report['gc_objects']}, поколения: {report['gc_counts']}, "
+        f"неудаляемых: {report['gc_uncollectable']}\n"
+        f"Фигур matplotlib: pyplot {pyplot_open}, всего в памяти {in_heap}\n"
+    )
+    fsm = report["fsm"]
+    if fsm is not None:
+        text += f"FSM: ключей {fsm['keys']}, в состоянии {fsm['with_state']}, данных ~{fsm['bytes'] / 1024:.1f} КБ\n"
+
+    if not report["tracing_since_start"]:
+        text += "\ntracemalloc только что включён — повторите команду позже, чтобы увидеть распределения."
+        return text
+
+    text += f"Отслежено tracemalloc: {report['traced_mb']:.1f} МБ\n\n📍 Топ мест выделения:\n"
+    for site, size, count in report["top"]:
+        text += f"{_short_site(site)} — {size / 1024:.1f} КБ ({count})\n"
+
+    if report["growth"]:
+        text += "\n📈 Рост с прошлого снимка:\n"
+        for site, size_diff, count_diff in report["growth"]:
+            text += f"{_short_site(site)} — {size_diff / 1024:+.1f} КБ ({count_diff:+d})\n"
+    text += f"\n💾 Снимок: {report['snapshot_path']}"
+    return text
+
+
+async def sample_memory_periodically(storage=None):
+    """
+    Периодически снимает отчёт о памяти, пишет сводку в лог и снимок в MEM_SNAPSHOT_DIR.
+    """
+    if MEM_SAMPLE_INTERVAL_MINUTES <= 0:
+        return
+    while True:
+        started = time.perf_counter()
+        try:
+            fsm_stats = fsm_storage_stats(storage) if storage is not None else None
+            report = await asyncio.to_thread(collect_memory_report, fsm_stats)
+            fsm = report["fsm"] or {}
+            logger.info(
+                "Память: RSS %s МБ, объектов %s, FSM ключей %s, фигур %s, снимок %s",
+                round(report["rss_mb"] or 0, 1), report["gc_objects"], fsm.get("keys"),
+                report["figures"][1], report["snapshot_path"],
+                extra={"event": "memory_sample", "duration_ms": round((time.perf_counter() - started) * 1000, 2)}
+            )
+        except Exception as e:
+            logger.exception(f"❌ Ошибка при сборе статистики памяти: {e}")
+        await asyncio.sleep(MEM_SAMPLE_INTERVAL_MINUTES * 60)
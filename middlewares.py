@@ -0,0 +1,46 @@
+﻿# middlewares.py
+# Middleware диспетчера
+
+import os
+import time
+import logging
+
+from aiogram import BaseMiddleware
+
+# Обработчики дольше этого порога логируются всегда, остальные — с сэмплированием
+SLOW_HANDLER_MS = float(os.getenv("SLOW_HANDLER_MS", "500"))
+
+logger = logging.getLogger("bot.handlers")
+
+
+class LoggingMiddleware(BaseMiddleware):
+    """
+    Логирует каждый вызов обработчика: пользователь, имя обработчика и длительность.
+    Подключается как inner-middleware, чтобы имя обработчика было уже известно.
+    """
+
+    async def __call__(self, handler, event, data):
+        handler_object = data.get("handler")
+        handler_name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        user = data.get("event_from_user")
+        extra = {
+            "event": "handler",
+            "user_id": user.id if user else None,
+            "handler": handler_name,
+            "update_type": type(event).__name__,
+        }
+
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            extra["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            logger.exception("Ошибка в обработчике %s", handler_name, extra=extra)
+            raise
+        finally:
+            if "duration_ms" not in extra:
+                extra["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                if extra["duration_ms"] >= SLOW_HANDLER_MS:
+                    logger.warning("Медленный обработчик %s", handler_name, extra=extra)
+                else:
+                    logger.info("Обработчик %s", handler_name, extra={**extra, "sampled": True})
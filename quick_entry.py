@@ -0,0 +1,73 @@
+﻿# quick_entry.py
+# Разбор записи давления, введённой одним сообщением: "135/85 72 после прогулки"
+
+import re
+
+# Допустимые диапазоны значений
+SYSTOLIC_RANGE = (50, 260)
+DIASTOLIC_RANGE = (30, 160)
+PULSE_RANGE = (30, 220)
+COMMENT_MAX_LENGTH = 500
+
+# Поле -> (диапазон, название в сообщениях об ошибке)
+FIELDS = {
+    "systolic": (SYSTOLIC_RANGE, "Верхнее давление"),
+    "diastolic": (DIASTOLIC_RANGE, "Нижнее давление"),
+    "pulse": (PULSE_RANGE, "Пульс"),
+}
+
+# верхнее, разделитель (/, \, пробел), нижнее, разделитель, пульс, затем необязательный комментарий
+_READING_RE = re.compile(
+    r"^\s*(\d{2,3})\s*(?:[/\\]\s*|\s+)(\d{2,3})\s*(?:[/\\,;]\s*|\s+)(\d{2,3})(?:\s+(.*?))?\s*$",
+    re.DOTALL
+)
+
+
+class ReadingValidationError(ValueError):
+    """
+    Сообщение разобрано, но значения вне допустимых диапазонов.
+    """
+
+
+def check_value(field, value):
+    """
+    Проверяет одно значение ("systolic", "diastolic" или "pulse") по допустимому диапазону.
+    Бросает ReadingValidationError.
+    """
+    (low, high), name = FIELDS[field]
+    if not low <= value <= high:
+        raise ReadingValidationError(f"{name}: допустимо от {low} до {high}, получено {value}.")
+
+
+def check_pressure(systolic, diastolic):
+    if systolic <= diastolic:
+        raise ReadingValidationError("Верхнее давление должно быть больше нижнего.")
+
+
+def check_comment(comment):
+    if comment is not None and len(comment) > COMMENT_MAX_LENGTH:
+        raise ReadingValidationError(f"Комментарий длиннее {COMMENT_MAX_LENGTH} символов.")
+
+
+def parse_reading(text):
+    """
+    Разбирает запись вида "135/85 72 комментарий" или "135 85 72".
+    Возвращает (systolic, diastolic, pulse, comment) или None, если формат не распознан.
+    Если формат верный, но значения недопустимы, бросает ReadingValidationError.
+    """
+    if not text:
+        return None
+    match = _READING_RE.match(text)
+    if match is None:
+        return None
+
+    systolic, diastolic, pulse = (int(match.group(i)) for i in (1, 2, 3))
+    comment = match.group(4) or None
+
+    check_value("systolic", systolic)
+    check_value("diastolic", diastolic)
+    check_value("pulse", pulse)
+    check_pressure(systolic, diastolic)
+    check_comment(comment)
+
+    return systolic, diastolic, pulse, comment
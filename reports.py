@@ -0,0 +1,323 @@
+﻿# reports.py
+# Недельные PDF-отчёты: пакетная подготовка в нерабочие часы и выдача готового файла
+
+import os
+import json
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+
+from charts import pressure_chart
+from database.baselines import HIGH_SYSTOLIC, HIGH_DIASTOLIC
+
+# Настройки (можно переопределить через .env)
+REPORTS_DIR = os.getenv("REPORTS_DIR", "database/reports")
+REPORT_PERIOD_DAYS = int(os.getenv("REPORT_PERIOD_DAYS", "7"))
+REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", "28"))  # Отчёты старше удаляются
+REPORT_BUILD_WEEKDAY = int(os.getenv("REPORT_BUILD_WEEKDAY", "0"))  # 0 — понедельник
+REPORT_BUILD_HOUR = int(os.getenv("REPORT_BUILD_HOUR", "3"))  # Местное время запуска пакета
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_CHUNK_SIZE = int(os.getenv("REPORT_CHUNK_SIZE", "50"))  # Пользователей в одной задаче пула
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+A4_PORTRAIT = (8.27, 11.69)
+ROWS_PER_PAGE = 48
+COMMENT_MAX_CHARS = 45
+
+
+def report_period(now=None):
+    """
+    Период отчёта (start, end): последние REPORT_PERIOD_DAYS дней до текущего момента по UTC,
+    как временные метки в базе. Записи выбираются от start без верхней границы,
+    чтобы не потерять сохранённую в ту же секунду.
+    """
+    end = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    start = end - timedelta(days=REPORT_PERIOD_DAYS)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+
+def report_paths(user_id, directory=REPORTS_DIR):
+    """
+    (путь к PDF, путь к файлу с метаданными) отчёта пользователя.
+    """
+    base = os.path.join(directory, str(user_id))
+    return base + ".pdf", base + ".json"
+
+
+def last_reading_key(timestamp, systolic, diastolic, pulse):
+    # По последней учтённой записи определяем, появились ли новые
+    return [timestamp, systolic, diastolic, pulse]
+
+
+def read_report_meta(user_id, directory=REPORTS_DIR):
+    pdf_path, meta_path = report_paths(user_id, directory)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(pdf_path) else None
+
+
+# Страницы отчёта
+
+def _day(timestamp):
+    return datetime.strptime(timestamp, TIMESTAMP_FORMAT).strftime("%d.%m.%Y")
+
+
+def _table(ax, cells, columns, fontsize=10, **kwargs):
+    # Фиксированный размер шрифта: автоподбор — самая медленная часть рендера таблицы
+    table = ax.table(cellText=cells, colLabels=columns, loc="upper center", **kwargs)
+    table.auto_set_font_size(False)
+    table.set_fontsize(fontsize)
+    return table
+
+
+def _summary_page(pdf, user_id, start, end, dates, values):
+    figure = Figure(figsize=A4_PORTRAIT)
+    figure.text(0.5, 0.95, "Дневник давления: отчёт за неделю", ha="center", fontsize=16)
+    figure.text(
+        0.5, 0.92,
+        f"{_day(start)} — {_day(end)} · записей: {len(dates)} · пользователь {user_id}",
+        ha="center", fontsize=10, color="dimgray"
+    )
+
+    # Общая статистика по показателям
+    ax = figure.add_axes([0.08, 0.66, 0.84, 0.2])
+    ax.axis("off")
+    ax.set_title("Сводка", loc="left", fontsize=12)
+    cells = []
+    for label, column in zip(("Верхнее", "Нижнее", "Пульс"), values.T):
+        std = column.std(ddof=1) if len(column) > 1 else 0.0
+        cells.append([label, f"{column.mean():.0f}", f"{column.min()}", f"{column.max()}", f"{std:.1f}"])
+    _table(ax, cells, ["", "Среднее", "Мин.", "Макс.", "Ст. откл."], cellLoc="center").scale(1, 1.6)
+
+    high = np.count_nonzero((values[:, 0] >= HIGH_SYSTOLIC) | (values[:, 1] >= HIGH_DIASTOLIC))
+    days = sorted({date.date() for date in dates})
+    figure.text(
+        0.08, 0.75,
+        f"Дней с измерениями: {len(days)}\n"
+        f"Измерений не ниже {HIGH_SYSTOLIC}/{HIGH_DIASTOLIC}: {high} ({high / len(dates):.0%})",
+        fontsize=10, va="top"
+    )
+
+    # Средние по дням
+    ax = figure.add_axes([0.08, 0.05, 0.84, 0.62])
+    ax.axis("off")
+    ax.set_title("По дням", loc="left", fontsize=12)
+    day_index = np.array([days.index(date.date()) for date in dates])
+    cells = []
+    for i, day in enumerate(days):
+        day_values = values[day_index == i]
+        mean = day_values.mean(axis=0)
+        cells.append([
+            f"{day:%d.%m.%Y}", len(day_values), f"{mean[0]:.0f} / {mean[1]:.0f}", f"{mean[2]:.0f}",
+            f"{day_values[:, 0].max()} / {day_values[:, 1].max()}"
+        ])
+    _table(ax, cells, ["Дата", "Записей", "Среднее", "Пульс", "Максимум"], cellLoc="center").scale(1, 1.4)
+    pdf.savefig(figure)
+
+
+def _records_pages(pdf, rows):
+    for first in range(0, len(rows), ROWS_PER_PAGE):
+        figure = Figure(figsize=A4_PORTRAIT)
+        ax = figure.add_axes([0.05, 0.04, 0.9, 0.9])
+        ax.axis("off")
+        ax.set_title("Все записи за период", loc="left", fontsize=12)
+        cells = []
+        for timestamp, systolic, diastolic, pulse, comment in rows[first:first + ROWS_PER_PAGE]:
+            comment = comment or "—"
+            if len(comment) > COMMENT_MAX_CHARS:
+                comment = comment[:COMMENT_MAX_CHARS - 1] + "…"
+            cells.append([timestamp[:16], f"{systolic} / {diastolic}", pulse, comment])
+        _table(
+            ax, cells, ["Дата и время", "Давление", "Пульс", "Комментарий"], fontsize=8,
+            colWidths=[0.22, 0.14, 0.08, 0.56], cellLoc="left"
+        ).scale(1, 1.3)
+        pdf.savefig(figure)
+
+
+def render_weekly_pdf(path, user_id, start, end, rows):
+    """
+    Рисует многостраничный отчёт: сводка и средние по дням, график, список записей.
+    rows — результат Storage.measurements_range за период.
+    """
+    dates = [datetime.strptime(row[0], TIMESTAMP_FORMAT) for row in rows]
+    values = np.array([row[1:4] for row in rows], dtype=np.int64)
+
+    with PdfPages(path, metadata={"Title": "Отчёт о давлении за неделю", "Subject": f"{start} — {end}"}) as pdf:
+        _summary_page(pdf, user_id, start, end, dates, values)
+
+        # График — на том же шаблоне, что и "📈 График давления"
+        chart = pressure_chart()
+        chart.draw(dates, values[:, 0], values[:, 1], values[:, 2])
+        pdf.savefig(chart.figure)
+
+        _records_pages(pdf, rows)
+
+
+def write_report(user_id, start, end, rows, directory=REPORTS_DIR):
+    """
+    Строит отчёт и атомарно заменяет предыдущий. Возвращает метаданные.
+    """
+    os.makedirs(directory, exist_ok=True)
+    pdf_path, meta_path = report_paths(user_id, directory)
+    suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+
+    render_weekly_pdf(pdf_path + suffix, user_id, start, end, rows)
+    os.replace(pdf_path + suffix, pdf_path)
+
+    meta = {
+        "period_start": start,
+        "period_end": end,
+        "count": len(rows),
+        "last_reading": last_reading_key(*rows[-1][:4]),
+        "created": datetime.now().strftime(TIMESTAMP_FORMAT),
+    }
+    with open(meta_path + suffix, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(meta_path + suffix, meta_path)
+    return meta
+
+
+def render_report_chunk(jobs, directory):
+    """
+    Выполняется в процессе пула: строит отчёты для группы пользователей.
+    jobs — [(user_id, start, end, rows), ...]. Возвращает (число готовых, [(user_id, ошибка), ...]).
+    """
+    built, failed = 0, []
+    for user_id, start, end, rows in jobs:
+        try:
+            write_report(user_id, start, end, rows, directory)
+            built += 1
+        except Exception as e:
+            failed.append((user_id, repr(e)))
+    return built, failed
+
+
+def remove_expired_reports(directory=REPORTS_DIR, days=REPORT_RETENTION_DAYS):
+    """
+    Удаляет отчёты (и их метаданные), не обновлявшиеся дольше days дней. Возвращает число удалённых.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - days * 86400
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += name.endswith(".pdf")
+        except OSError:
+            pass
+    return removed
+
+
+def start_report_pool(workers=REPORT_WORKERS):
+    """
+    Пул процессов для пакетной подготовки отчётов; все процессы запускаются сразу.
+    Вызывать при старте, пока в процессе нет других потоков: fork многопоточного процесса
+    может унаследовать чужую захваченную блокировку (логирование, sqlite, malloc) и зависнуть.
+    При workers <= 0 возвращает None — отчёты строятся в текущем процессе.
+    """
+    if workers <= 0:
+        return None
+    # fork: при spawn/forkserver дочерний процесс заново выполнил бы main.py (создание бота и т. д.)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+    # С fork пул создаёт все процессы при первой задаче — делаем это сейчас, а не из фонового потока
+    pool.submit(int).result()
+    return pool
+
+
+def build_weekly_reports(storage, pool=None, directory=REPORTS_DIR, chunk_size=REPORT_CHUNK_SIZE, max_pending=2 * REPORT_WORKERS):
+    """
+    Пакетная подготовка отчётов для всех, у кого есть записи за период.
+    Данные читаются здесь, рендер идёт в пуле pool (см. start_report_pool) группами по chunk_size
+    пользователей; без пула или если пул сломан (процесс погиб) — в текущем процессе.
+    Возвращает (построено, [(user_id, ошибка), ...], удалено устаревших).
+    """
+    start, end = report_period()
+    user_ids = storage.active_user_ids(start)
+    built, failed = 0, []
+    pending = {}  # future -> jobs, чтобы достроить группу здесь, если пул сломается
+
+    def collect(chunk_built, chunk_failed):
+        nonlocal built
+        built += chunk_built
+        failed.extend(chunk_failed)
+
+    def result(future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            return render_report_chunk(pending[future], directory)
+
+    for first in range(0, len(user_ids), chunk_size):
+        # Вся группа — одним запросом к основной базе
+        chunk = storage.measurements_since(user_ids[first:first + chunk_size], start)
+        jobs = [(user_id, start, end, rows) for user_id, rows in chunk.items()]
+        future = None
+        if pool is not None:
+            try:
+                future = pool.submit(render_report_chunk, jobs, directory)
+            except BrokenProcessPool:
+                pass
+        if future is None:
+            collect(*render_report_chunk(jobs, directory))
+            continue
+        pending[future] = jobs
+
+        # Не читаем данные сильно впереди рендера — держим в памяти не больше max_pending групп
+        if len(pending) >= max_pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(*result(future))
+                del pending[future]
+
+    for future in pending:
+        collect(*result(future))
+
+    return built, failed, remove_expired_reports(directory)
+
+
+def get_weekly_report(storage, user_id, directory=REPORTS_DIR):
+    """
+    Возвращает (путь к PDF, метаданные) для пользователя или None, если записей за период нет.
+    Готовый отчёт отдаётся как есть; перестраивается, только если с тех пор появились новые записи.
+    Вызывать из отдельного потока (asyncio.to_thread).
+    """
+    latest = storage.recent_measurements(user_id, 1)
+    if not latest:
+        return None
+
+    systolic, diastolic, pulse, _, timestamp = latest[0]
+    meta = read_report_meta(user_id, directory)
+    if meta is not None and meta["last_reading"] == last_reading_key(timestamp, systolic, diastolic, pulse):
+        return report_paths(user_id, directory)[0], meta
+
+    start, end = report_period()
+    rows = storage.measurements_range(user_id, start)
+    if not rows:
+        return None
+    meta = write_report(user_id, start, end, rows, directory)
+    return report_paths(user_id, directory)[0], meta
+
+
+def seconds_until_next_build(now=None):
+    """
+    Секунды до ближайшего запуска пакета: REPORT_BUILD_WEEKDAY, REPORT_BUILD_HOUR:00 по местному времени.
+    """
+    now = now or datetime.now()
+    run = now.replace(hour=REPORT_BUILD_HOUR, minute=0, second=0, microsecond=0)
+    run += timedelta(days=(REPORT_BUILD_WEEKDAY - now.weekday()) % 7)
+    if run <= now:
+        run += timedelta(days=7)
+    return (run - now).total_seconds()